@@ -0,0 +1,81 @@
+"""Компактная сериализация лент для API.
+
+Строки читаются через values(): объекты моделей не создаются, автор
+и группа приходят в том же запросе как username и slug. Лента листается
+keyset-курсором по (pub_date, id), как HTML-ленты с ?cursor=.
+"""
+from django.core.files.storage import default_storage
+from django.db.models import Q
+
+from posts.pagination import NEXT, decode_cursor, encode_cursor
+
+# Поле API: путь values() от поста.
+FIELDS = {
+    'id': 'pk',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+
+
+def parse_fields(value) -> tuple:
+    """Поля из ?fields=id,text; ValueError для неизвестных полей."""
+    if not value:
+        return tuple(FIELDS)
+    fields = tuple(dict.fromkeys(
+        field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown or not fields:
+        raise ValueError(', '.join(unknown))
+    return fields
+
+
+class Feed:
+    """Строки ленты и области кэша, от версий которых она зависит.
+
+    Лента подписок читается из TimelineEntry: тогда prefix — путь
+    от записи к посту, а key — поле с id поста.
+    """
+
+    def __init__(self, queryset, scopes, key: str = 'pk', prefix: str = ''):
+        self.queryset = queryset
+        self.scopes = scopes
+        self.key = key
+        self.prefix = prefix
+
+    def newest(self):
+        """pub_date самой свежей записи: один запрос по индексу."""
+        if not hasattr(self, '_newest'):
+            self._newest = self.queryset.order_by('-pub_date').values_list(
+                'pub_date', flat=True).first()
+        return self._newest
+
+    def page(self, fields: tuple, token, limit: int):
+        """Строки страницы после курсора и курсор следующей страницы."""
+        rows = self.queryset.order_by('-pub_date', f'-{self.key}')
+        position = decode_cursor(token) if token else None
+        if position is not None and position[0] == NEXT:
+            _, pub_date, pk = position
+            rows = rows.filter(
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, **{f'{self.key}__lt': pk}))
+        lookups = {field: self.prefix + FIELDS[field] for field in fields}
+        columns = dict.fromkeys(['pub_date', self.key, *lookups.values()])
+        rows = list(rows.values(*columns)[:limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(
+                NEXT, last['pub_date'], last[self.key])
+        return [serialize(row, lookups) for row in rows], next_cursor
+
+
+def serialize(row: dict, lookups: dict) -> dict:
+    data = {field: row[lookup] for field, lookup in lookups.items()}
+    if 'image' in data:
+        data['image'] = (default_storage.url(data['image'])
+                         if data['image'] else None)
+    return data
@@ -0,0 +1,85 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedApiTests(TestCase):
+    NUMBER_OF_POSTS: int = 25
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='api_author')
+        cls.reader = User.objects.create_user(username='api_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='api-group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(cls.NUMBER_OF_POSTS):
+            Post.objects.create(text=f'Пост {number}', author=cls.author,
+                                group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def collect(self, client, url):
+        """Все страницы ленты по ссылкам next."""
+        results = []
+        while url:
+            data = client.get(url).json()
+            results += data['results']
+            url = data['next']
+        return results
+
+    def test_feeds_paginate_by_cursor(self):
+        """Ленты отдаются целиком по курсору, без повторов."""
+        urls = [
+            reverse('api:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('api:profile_posts',
+                    kwargs={'username': self.author.username}),
+            reverse('api:follow'),
+        ]
+        expected = list(self.author.posts.order_by(
+            '-pub_date', '-pk').values_list('pk', flat=True))
+        for url in urls:
+            with self.subTest(url=url):
+                results = self.collect(self.reader_client, url)
+                self.assertEqual([row['id'] for row in results], expected)
+                self.assertEqual(results[0]['author'], 'api_author')
+                self.assertEqual(results[0]['group'], 'api-group')
+
+    def test_fields(self):
+        """?fields= ограничивает набор полей, неизвестное поле — 400."""
+        url = reverse('api:posts')
+        row = self.client.get(url, {'fields': 'id,text'}).json()['results'][0]
+        self.assertEqual(set(row), {'id', 'text'})
+        response = self.client.get(url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304, пока лента не изменилась."""
+        url = reverse('api:profile_posts',
+                      kwargs={'username': self.author.username})
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        post = self.author.posts.first()
+        post.text = 'Исправленный текст'
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_follow_requires_login(self):
+        response = self.client.get(reverse('api:follow'))
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
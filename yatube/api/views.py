@@ -0,0 +1,129 @@
+"""Read-only API лент: /api/v1/posts/, /api/v1/groups/<slug>/posts/,
+/api/v1/profile/<username>/posts/ и /api/v1/follow/.
+
+ETag строится из версий областей кэша ленты (они сдвигаются при любой
+записи, см. posts.feed_cache), свежего pub_date и параметров запроса;
+Last-Modified — свежий pub_date. Ответ 304 отдаётся до чтения строк.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET
+
+from posts import feed_cache, timeline
+from posts.models import Group, Post
+from posts.pagination import CURSOR_PARAM
+
+from .serializers import Feed, parse_fields
+
+User = get_user_model()
+
+
+def _page_size(request) -> int:
+    try:
+        limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+    except ValueError:
+        limit = settings.API_PAGE_SIZE
+    return max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+
+def _next_url(request, next_cursor):
+    if next_cursor is None:
+        return None
+    query = request.GET.copy()
+    query[CURSOR_PARAM] = next_cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def _etag(request, **kwargs):
+    feed = request.api_feed
+    raw = '|'.join((feed_cache.get_versions(*feed.scopes),
+                    str(feed.newest()), request.GET.urlencode()))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _last_modified(request, **kwargs):
+    return request.api_feed.newest()
+
+
+@condition(etag_func=_etag, last_modified_func=_last_modified)
+def _respond(request, **kwargs):
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+    except ValueError as error:
+        return JsonResponse(
+            {'detail': f'Неизвестные поля: {error}'}, status=400)
+    results, next_cursor = request.api_feed.page(
+        fields, request.GET.get(CURSOR_PARAM), _page_size(request))
+    return JsonResponse(
+        {
+            'results': results,
+            'next_cursor': next_cursor,
+            'next': _next_url(request, next_cursor),
+        },
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def feed_view(build, private: bool = False):
+    """Превращает build(request, **kwargs) -> Feed в представление API."""
+    @require_GET
+    @wraps(build)
+    def view(request, **kwargs):
+        if private and not request.user.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Нужна авторизация'}, status=401)
+        # Feed нужен и для ETag, и для самого ответа: строим его один раз.
+        request.api_feed = build(request, **kwargs)
+        response = _respond(request, **kwargs)
+        # Кэши должны перепроверять ответ по ETag при каждом запросе.
+        if private:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, no_cache=True)
+        return response
+    return view
+
+
+@feed_view
+def posts(request):
+    return Feed(Post.objects.all(),
+                [feed_cache.index_scope(), feed_cache.groups_scope()])
+
+
+@feed_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return Feed(group.posts.all(), [feed_cache.group_scope(group.pk),
+                                    feed_cache.groups_scope()])
+
+
+@feed_view
+def profile_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return Feed(author.posts.all(), [feed_cache.author_scope(author.pk),
+                                     feed_cache.groups_scope()])
+
+
+def _follow(request):
+    """Как follow_index: материализованная лента плюс посты знаменитостей."""
+    entries = request.user.timeline.all()
+    celebrities = timeline.followed_celebrities(request.user)
+    scopes = [feed_cache.follow_scope(request.user.pk),
+              feed_cache.groups_scope()]
+    scopes += [feed_cache.author_scope(author_id)
+               for author_id in celebrities]
+    if celebrities:
+        return Feed(Post.objects.filter(
+            Q(pk__in=entries.values('post'))
+            | Q(author_id__in=celebrities)), scopes)
+    return Feed(entries, scopes, key='post', prefix='post__')
+
+
+follow = feed_view(_follow, private=True)
@@ -0,0 +1,120 @@
+"""Чтение ленты под конкурентной записью на SQLite.
+
+Писатели в своих потоках создают комментарии через ORM, как add_comment
+(с сигналами счётчиков и кэша), читатели в это время читают первую
+страницу главной ленты и число постов, как index. Замер повторяется
+для настроек SQLite по умолчанию (журнал DELETE, без PRAGMA) и для
+профиля SQLITE_PRAGMAS. Созданные комментарии в конце удаляются.
+
+Нужна база в файле: у SQLite в памяти нет общих блокировок между
+соединениями, и сравнивать там нечего.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection, connections, transaction
+from django.test.utils import override_settings
+
+from posts.models import Comment, Post
+
+from .runner import summarize
+
+User = get_user_model()
+
+FEED_PAGE: int = 10
+POSTS_SAMPLE: int = 100
+DELETE_BATCH: int = 500
+# Профиль по умолчанию явно возвращает журнал DELETE: режим WAL
+# сохраняется в файле базы.
+DEFAULT_PROFILE = {'journal_mode': 'DELETE'}
+
+
+class Load:
+    def __init__(self):
+        self.stop = threading.Event()
+        self.latencies = []
+        self.created = []
+        self.read_errors = 0
+        self.write_errors = 0
+
+    def read(self) -> None:
+        try:
+            while not self.stop.is_set():
+                started = time.perf_counter()
+                try:
+                    list(Post.objects.for_feed()[:FEED_PAGE])
+                    Post.objects.count()
+                except OperationalError:
+                    self.read_errors += 1
+                    continue
+                self.latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    def write(self, author_id: int, post_ids: list, seed: int) -> None:
+        choice = random.Random(seed).choice
+        try:
+            while not self.stop.is_set():
+                try:
+                    with transaction.atomic():
+                        comment = Comment.objects.create(
+                            text='Нагрузочный комментарий',
+                            author_id=author_id, post_id=choice(post_ids))
+                except OperationalError:
+                    self.write_errors += 1
+                    continue
+                self.created.append(comment.pk)
+        finally:
+            connection.close()
+
+
+def run_profile(readers: int, writers: int, seconds: float) -> dict:
+    author_id = User.objects.values_list('pk', flat=True).first()
+    post_ids = list(Post.objects.values_list('pk', flat=True)[:POSTS_SAMPLE])
+    if author_id is None or not post_ids:
+        raise ValueError('Нет данных: сначала запустите seed_yatube')
+    connections.close_all()
+    load = Load()
+    threads = [threading.Thread(target=load.read) for _ in range(readers)]
+    threads += [threading.Thread(target=load.write,
+                                 args=(author_id, post_ids, number))
+                for number in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    load.stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    result = summarize(load.latencies or [0.0], None, elapsed)
+    result.pop('queries_per_request')
+    result.update(
+        writes_per_second=round(len(load.created) / elapsed, 1),
+        read_errors=load.read_errors,
+        write_errors=load.write_errors,
+    )
+    for start in range(0, len(load.created), DELETE_BATCH):
+        Comment.objects.filter(
+            pk__in=load.created[start:start + DELETE_BATCH]).delete()
+    return result
+
+
+def run(readers: int = 8, writers: int = 2, seconds: float = 5) -> dict:
+    if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+        raise ValueError('Замер нужен на базе SQLite в файле')
+    profiles = {'default': DEFAULT_PROFILE,
+                'tuned': settings.SQLITE_PRAGMAS or None}
+    results = {}
+    for name, pragmas in profiles.items():
+        if pragmas is None:
+            continue
+        # Новые соединения потоков получат PRAGMA профиля.
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            connections.close_all()
+            results[name] = run_profile(readers, writers, seconds)
+    connections.close_all()
+    return results
@@ -0,0 +1,284 @@
+"""Синтетические данные для нагрузочных замеров.
+
+Авторы, группы и подписки распределены по степенному закону: немногие
+популярные авторы пишут большую часть постов и собирают большую часть
+подписчиков, как в настоящей соцсети. Тексты берутся из Faker,
+записи создаются пачками через bulk_create, поэтому сигналы не
+срабатывают — счётчики, поисковый индекс и ленты подписок
+перестраиваются в конце.
+
+Посты, подписки и комментарии могут создаваться несколькими
+процессами: каждый генерирует свою долю строк и пишет её короткими
+транзакциями по одной пачке. Вторичные индексы больших таблиц на время
+загрузки удаляются и строятся заново в конце.
+"""
+import random
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+from faker import Faker
+
+from posts import denormalized
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+TEXT_POOL_SIZE: int = 1000
+# Показатель степенного закона популярности авторов и групп.
+ZIPF_EXPONENT: float = 1.1
+LOADED_MODELS = (Post, Follow, Comment)
+
+
+@dataclass
+class Volume:
+    users: int = 1000
+    groups: int = 100
+    posts: int = 10000
+    follows: int = 20000
+    comments: int = 10000
+    days: int = 365
+
+
+def zipf_weights(count: int, exponent: float = ZIPF_EXPONENT) -> list:
+    """Накопленные веса рангов 1..count для random.choices."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+def pk_values(model) -> Sequence:
+    """pk всех строк модели. Если они идут подряд, это range: воркеру
+    передаются три числа, а не миллион pk."""
+    bounds = model.objects.aggregate(
+        first=Min('pk'), last=Max('pk'), count=Count('pk'))
+    if not bounds['count']:
+        return range(0)
+    if bounds['last'] - bounds['first'] + 1 == bounds['count']:
+        return range(bounds['first'], bounds['last'] + 1)
+    return list(model.objects.values_list('pk', flat=True))
+
+
+@contextmanager
+def explicit_pub_dates():
+    """Позволяет задать pub_date вручную: auto_now_add перезаписал бы
+    его текущим временем при bulk_create."""
+    field = Post._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def secondary_indexes(table: str) -> list:
+    """Пары (имя, CREATE INDEX) индексов таблицы, которые можно
+    удалить на время загрузки. Индексы первичных ключей и уникальных
+    ограничений остаются: без них не работает ignore_conflicts."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+                "AND tbl_name = %s AND sql IS NOT NULL "
+                "AND sql NOT LIKE 'CREATE UNIQUE%%'", [table])
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT indexname, indexdef FROM pg_indexes '
+                'WHERE tablename = %s AND indexname NOT IN '
+                '(SELECT conname FROM pg_constraint) '
+                "AND indexdef NOT LIKE 'CREATE UNIQUE%%'", [table])
+        else:
+            return []
+        return cursor.fetchall()
+
+
+@contextmanager
+def indexes_dropped(models):
+    """Удаляет вторичные индексы таблиц и создаёт их заново на выходе."""
+    dropped = []
+    with connection.cursor() as cursor:
+        for model in models:
+            for name, sql in secondary_indexes(model._meta.db_table):
+                cursor.execute(
+                    f'DROP INDEX {connection.ops.quote_name(name)}')
+                dropped.append(sql)
+    try:
+        yield dropped
+    finally:
+        with connection.cursor() as cursor:
+            for sql in dropped:
+                cursor.execute(sql)
+
+
+@contextmanager
+def fast_writes():
+    """На SQLite отключает fsync после каждой транзакции загрузки.
+
+    Внутри внешней транзакции режим менять нельзя, он остаётся прежним.
+    """
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA synchronous')
+        synchronous = cursor.fetchone()[0]
+        cursor.execute('PRAGMA synchronous = OFF')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA synchronous = {int(synchronous)}')
+
+
+def _init_worker():
+    # Соединение родителя не должно использоваться в дочернем процессе.
+    connections.close_all()
+
+
+def _load_share(table: str, volume: Volume, seed: int, batch_size: int,
+                ids: tuple) -> int:
+    """Воркер: генерирует и записывает свою долю строк таблицы."""
+    generator = Generator(volume, seed=seed, batch_size=batch_size)
+    with fast_writes(), explicit_pub_dates():
+        return generator.load(table, *ids)
+
+
+class Generator:
+    TABLES = {'posts': Post, 'follows': Follow, 'comments': Comment}
+
+    def __init__(self, volume: Volume, seed: int = 0,
+                 batch_size: int = 5000, workers: int = 1, report=None):
+        self.volume = volume
+        self.seed = seed
+        self.batch_size = batch_size
+        self.workers = workers
+        self.report = report or (lambda message: None)
+        self.random = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.texts = [self.fake.text(max_nb_chars=300)
+                      for _ in range(TEXT_POOL_SIZE)]
+        self.now = timezone.now()
+
+    def _bulk(self, model, objects) -> int:
+        """Пишет строки пачками, каждую пачку — своей транзакцией."""
+        batch = []
+        written = 0
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                written += self._write(model, batch)
+                batch = []
+        return written + self._write(model, batch)
+
+    @staticmethod
+    def _write(model, batch) -> int:
+        with transaction.atomic():
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+        return len(batch)
+
+    def _pick(self, ids: Sequence, weights: list, count: int) -> list:
+        return self.random.choices(ids, cum_weights=weights, k=count)
+
+    def users(self):
+        start = User.objects.count()
+        for number in range(start, start + self.volume.users):
+            yield User(username=f'{self.fake.user_name()}_{number}',
+                       first_name=self.fake.first_name(),
+                       last_name=self.fake.last_name())
+
+    def groups(self):
+        start = Group.objects.count()
+        for number in range(start, start + self.volume.groups):
+            yield Group(title=self.fake.catch_phrase()[:200],
+                        slug=f'group-{number}',
+                        description=self.fake.sentence())
+
+    def posts(self, user_ids: Sequence, group_ids: Sequence):
+        authors = self._pick(user_ids, zipf_weights(len(user_ids)),
+                             self.volume.posts)
+        group_weights = zipf_weights(len(group_ids)) if group_ids else None
+        seconds = self.volume.days * 24 * 60 * 60
+        for author_id in authors:
+            group_id = None
+            if group_ids and self.random.random() < 0.7:
+                group_id = self._pick(group_ids, group_weights, 1)[0]
+            yield Post(
+                text=self.random.choice(self.texts),
+                author_id=author_id,
+                group_id=group_id,
+                pub_date=self.now - timedelta(
+                    seconds=self.random.randrange(seconds)))
+
+    def follows(self, user_ids: Sequence):
+        authors = self._pick(user_ids, zipf_weights(len(user_ids)),
+                             self.volume.follows)
+        for author_id in authors:
+            user_id = self.random.choice(user_ids)
+            if user_id != author_id:
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    def comments(self, user_ids: Sequence, post_ids: Sequence):
+        weights = zipf_weights(len(post_ids))
+        posts = self._pick(post_ids, weights, self.volume.comments)
+        for post_id in posts:
+            yield Comment(text=self.fake.sentence(),
+                          author_id=self.random.choice(user_ids),
+                          post_id=post_id)
+
+    def load(self, table: str, *ids) -> int:
+        return self._bulk(self.TABLES[table], getattr(self, table)(*ids))
+
+    def _parallel(self, table: str, *ids) -> None:
+        """Делит таблицу между воркерами; у каждого своё зерно."""
+        total = getattr(self.volume, table)
+        if self.workers <= 1:
+            with explicit_pub_dates():
+                written = self.load(table, *ids)
+            self.report(f'{table}: {written}')
+            return
+        shares = [total // self.workers + (index < total % self.workers)
+                  for index in range(self.workers)]
+        connections.close_all()
+        with ProcessPoolExecutor(self.workers,
+                                 initializer=_init_worker) as pool:
+            futures = [
+                pool.submit(_load_share, table,
+                            replace(self.volume, **{table: share}),
+                            self.seed * self.workers + index + 1,
+                            self.batch_size, ids)
+                for index, share in enumerate(shares) if share
+            ]
+            written = sum(future.result() for future in futures)
+        self.report(f'{table}: {written}')
+
+    def run(self, drop_indexes: bool = True, rebuild: bool = True) -> None:
+        with fast_writes():
+            self._bulk(User, self.users())
+            self._bulk(Group, self.groups())
+        user_ids = pk_values(User)
+        group_ids = pk_values(Group)
+        if not user_ids:
+            return
+        models = LOADED_MODELS if drop_indexes else ()
+        with indexes_dropped(models) as dropped, fast_writes():
+            self.report(f'Удалено индексов: {len(dropped)}')
+            self._parallel('posts', user_ids, group_ids)
+            self._parallel('follows', user_ids)
+            post_ids = pk_values(Post)
+            if post_ids:
+                self._parallel('comments', user_ids, post_ids)
+            self.report('Индексы создаются заново...')
+        if rebuild:
+            denormalized.rebuild(self.report)
+        else:
+            # Страницы, фрагменты и оценки числа постов в общем кэше
+            # посчитаны до загрузки: замеры читали бы их.
+            cache.clear()
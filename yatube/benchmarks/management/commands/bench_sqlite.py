@@ -0,0 +1,24 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import contention
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает чтение ленты под конкурентной записью с настройками '
+            'SQLite по умолчанию и с профилем SQLITE_PRAGMAS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5,
+                            help='Длительность замера каждого профиля.')
+
+    def handle(self, *args, **options):
+        try:
+            results = contention.run(options['readers'], options['writers'],
+                                     options['seconds'])
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import runner
+
+MODES = ('client', 'wsgi')
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку, число запросов к базе и пропускную '
+            'способность страниц постов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на каждую страницу.')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Параллельных клиентов WSGI-сервера.')
+        parser.add_argument('--mode', choices=MODES, action='append',
+                            help='Способ запросов, по умолчанию оба.')
+        parser.add_argument('--view', action='append',
+                            help='Замерять только эти страницы.')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом тестового клиента.')
+        parser.add_argument('--output', help='Файл для JSON с результатом.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого замера для сравнения.')
+
+    def handle(self, *args, **options):
+        pages, reader = runner.targets()
+        if options['view']:
+            unknown = set(options['view']) - set(pages)
+            if unknown:
+                raise CommandError(
+                    'Нет данных для страниц: ' + ', '.join(sorted(unknown)))
+            pages = {name: pages[name] for name in options['view']}
+        results = {}
+        for mode in options['mode'] or MODES:
+            if mode == 'client':
+                results[mode] = runner.run_client(
+                    pages, reader, options['requests'], options['cold'])
+            else:
+                results[mode] = runner.run_wsgi(
+                    pages, reader, options['requests'],
+                    options['concurrency'])
+        report = {
+            'environment': runner.environment(),
+            'options': {
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'cold': options['cold'],
+            },
+            'results': results,
+        }
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(data)
+        else:
+            self.stdout.write(data)
+        if options['compare']:
+            with open(options['compare']) as previous:
+                for line in runner.compare(json.load(previous), report):
+                    self.stderr.write(line)
@@ -0,0 +1,43 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from benchmarks.data import Generator, Volume
+
+VOLUME_FIELDS = ('users', 'groups', 'posts', 'follows', 'comments', 'days')
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, подписками и комментариями.')
+
+    def add_arguments(self, parser):
+        defaults = Volume()
+        for field in VOLUME_FIELDS:
+            parser.add_argument(f'--{field}', type=int,
+                                default=getattr(defaults, field))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Строк в одной транзакции.')
+        parser.add_argument('--workers', type=int,
+                            default=os.cpu_count() or 1,
+                            help='Процессов на каждую большую таблицу.')
+        parser.add_argument(
+            '--keep-indexes', action='store_true',
+            help='Не удалять вторичные индексы на время загрузки.')
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не пересчитывать счётчики, поиск и ленты подписок.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        volume = Volume(**{field: options[field] for field in VOLUME_FIELDS})
+        Generator(volume, seed=options['seed'],
+                  batch_size=options['batch_size'],
+                  workers=options['workers'],
+                  report=self.stdout.write).run(
+            drop_indexes=not options['keep_indexes'],
+            rebuild=not options['skip_rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.monotonic() - started:.1f} с'))
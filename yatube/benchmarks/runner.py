@@ -0,0 +1,196 @@
+"""Замеры задержки и пропускной способности страниц постов.
+
+Страницы запрашиваются двумя способами: через тестовый клиент Django
+(видно число SQL-запросов на страницу) и через настоящий WSGI-сервер
+по HTTP с несколькими потоками (видна пропускная способность).
+Результат — словарь, который сохраняется в JSON и сравнивается
+с замером другого коммита.
+"""
+import platform
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import django
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'queries_per_request')
+
+
+def targets() -> tuple:
+    """Страницы для замера и читатель для ленты подписок.
+
+    Берутся самые тяжёлые группа, автор и пост: на них видна
+    стоимость глубоких лент и длинных списков комментариев.
+    """
+    pages = {'index': (reverse('posts:index'), False)}
+    group = Group.objects.order_by('-posts_count').first()
+    if group is not None:
+        pages['group_posts'] = (
+            reverse('posts:group_list', kwargs={'slug': group.slug}), False)
+    author = User.objects.order_by('-stats__posts_count').first()
+    if author is not None:
+        pages['profile'] = (reverse(
+            'posts:profile', kwargs={'username': author.username}), False)
+    post = Post.objects.order_by('-comments_count').first()
+    if post is not None:
+        pages['post_detail'] = (reverse(
+            'posts:post_detail', kwargs={'post_id': post.pk}), False)
+    reader = User.objects.order_by('-stats__following_count').first()
+    if reader is not None:
+        pages['follow_index'] = (reverse('posts:follow_index'), True)
+    return pages, reader
+
+
+def summarize(latencies: list, queries, elapsed: float) -> dict:
+    """Перцентили задержки в миллисекундах и запросы в секунду."""
+    milliseconds = sorted(latency * 1000 for latency in latencies)
+    if len(milliseconds) > 1:
+        cuts = statistics.quantiles(milliseconds, n=100, method='inclusive')
+    else:
+        cuts = milliseconds * 99
+    return {
+        'requests': len(milliseconds),
+        'p50_ms': round(cuts[49], 3),
+        'p95_ms': round(cuts[94], 3),
+        'p99_ms': round(cuts[98], 3),
+        'mean_ms': round(statistics.mean(milliseconds), 3),
+        'rps': round(len(milliseconds) / elapsed, 1) if elapsed else None,
+        'queries_per_request': (
+            round(statistics.mean(queries), 2) if queries else None),
+    }
+
+
+def run_client(pages: dict, reader, count: int, cold: bool = False) -> dict:
+    """Последовательные запросы через тестовый клиент Django."""
+    results = {}
+    for name, (url, login) in pages.items():
+        client = Client(SERVER_NAME='localhost')
+        if login:
+            client.force_login(reader)
+        client.get(url)
+        latencies, queries = [], []
+        started = time.perf_counter()
+        for _ in range(count):
+            if cold:
+                cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                request_started = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - request_started)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url}: {response.status_code}')
+            queries.append(len(context))
+        results[name] = summarize(
+            latencies, queries, time.perf_counter() - started)
+    return results
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def wsgi_server():
+    """WSGI-приложение проекта на свободном порту в фоновом потоке."""
+    server = make_server('127.0.0.1', 0, get_wsgi_application(),
+                         server_class=ThreadingWSGIServer,
+                         handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def run_wsgi(pages: dict, reader, count: int, concurrency: int) -> dict:
+    """Параллельные HTTP-запросы к настоящему WSGI-серверу."""
+    session = {}
+    if reader is not None:
+        client = Client(SERVER_NAME='localhost')
+        client.force_login(reader)
+        session[settings.SESSION_COOKIE_NAME] = (
+            client.cookies[settings.SESSION_COOKIE_NAME].value)
+    results = {}
+    with wsgi_server() as base, ThreadPoolExecutor(concurrency) as pool:
+        for name, (url, login) in pages.items():
+            cookies = session if login else {}
+
+            def fetch(_, url=base + url, cookies=cookies):
+                started = time.perf_counter()
+                requests.get(url, cookies=cookies).raise_for_status()
+                return time.perf_counter() - started
+
+            fetch(None)
+            started = time.perf_counter()
+            latencies = list(pool.map(fetch, range(count)))
+            results[name] = summarize(
+                latencies, None, time.perf_counter() - started)
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    """Что нужно знать, чтобы сравнивать замеры между собой."""
+    return {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'cache': settings.CACHES['default']['BACKEND'],
+        # Гости с включённым кэшем страниц получают готовый ответ.
+        'page_cache': settings.PAGE_CACHE,
+        'users': User.objects.count(),
+        'posts': Post.objects.count(),
+        'follows': Follow.objects.count(),
+    }
+
+
+def compare(old: dict, new: dict) -> list:
+    """Строки с изменением метрик нового замера относительно старого."""
+    lines = []
+    for mode, views in new['results'].items():
+        for view, metrics in views.items():
+            before = old.get('results', {}).get(mode, {}).get(view)
+            if before is None:
+                continue
+            for metric in METRICS:
+                was, now = before.get(metric), metrics.get(metric)
+                if not was or now is None:
+                    continue
+                change = (now - was) / was * 100
+                lines.append(f'{mode} {view} {metric}: '
+                             f'{was} -> {now} ({change:+.1f}%)')
+    return lines
@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from posts.models import Follow, Group, Post, TimelineEntry
+
+from . import runner
+from .data import Generator, Volume, pk_values
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        volume = Volume(users=20, groups=3, posts=200, follows=40,
+                        comments=30, days=10)
+        Generator(volume, seed=1, batch_size=50).run()
+
+    def test_generated_data(self):
+        """Генератор создаёт посты и подписки и заполняет ленты."""
+        self.assertGreaterEqual(Post.objects.count(), 200)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertGreater(
+            Post.objects.values('pub_date').distinct().count(), 1)
+
+    def test_pk_values(self):
+        """Воркерам передаётся диапазон pk, если в них нет пропусков."""
+        self.assertIsInstance(pk_values(Post), range)
+        self.assertEqual(list(pk_values(Post)),
+                         list(Post.objects.order_by('pk')
+                              .values_list('pk', flat=True)))
+        Post.objects.order_by('pk')[1].delete()
+        self.assertEqual(sorted(pk_values(Post)),
+                         list(Post.objects.order_by('pk')
+                              .values_list('pk', flat=True)))
+
+    def test_run_clears_cache(self):
+        """После загрузки замеры не читают страницы из старого кэша."""
+        cache.set('stale-page', 'до загрузки')
+        Generator(Volume(users=2, groups=1, posts=3, follows=0, comments=0),
+                  seed=2).run(drop_indexes=False, rebuild=False)
+        self.assertIsNone(cache.get('stale-page'))
+        self.assertTrue(Group.objects.exists())
+
+    @override_settings(PAGE_CACHE=False)
+    def test_client_run(self):
+        """Замер тестовым клиентом даёт перцентили и число запросов."""
+        pages, reader = runner.targets()
+        self.assertEqual(set(pages), {'index', 'group_posts', 'profile',
+                                      'post_detail', 'follow_index'})
+        results = runner.run_client(pages, reader, count=3)
+        for name, metrics in results.items():
+            with self.subTest(page=name):
+                self.assertEqual(metrics['requests'], 3)
+                self.assertLessEqual(metrics['p50_ms'], metrics['p99_ms'])
+                self.assertGreater(metrics['queries_per_request'], 0)
@@ -0,0 +1,226 @@
+import itertools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB, expires REAL)'
+)
+
+
+class SQLiteCache(BaseCache):
+    """Общий для всех процессов кэш в файле SQLite.
+
+    Не требует внешних сервисов: воркеры gunicorn на одной машине
+    открывают один файл и видят одни и те же ключи и версии.
+    Целые числа хранятся как INTEGER, поэтому incr() выполняется
+    одним UPDATE внутри транзакции и атомарен между процессами.
+
+    Лишние записи удаляются не при каждой записи, а раз в
+    OPTIONS['CULL_EVERY'] записей процесса: подсчёт строк на каждый
+    set() стоил бы полного прохода по таблице.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        options = params.get('OPTIONS', {})
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._cull_every = options.get('CULL_EVERY', 100)
+        self._writes = itertools.count(1)
+
+    @property
+    def _db(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=self._busy_timeout,
+                isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _dump(value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _expires(self, timeout):
+        # Базовый класс возвращает момент истечения, а не длительность.
+        return self.get_backend_timeout(timeout)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('DELETE FROM cache WHERE key = ? AND expires <= ?',
+                       (key, time.time()))
+            cursor = db.execute(
+                'INSERT OR IGNORE INTO cache VALUES (?, ?, ?)',
+                (key, self._dump(value), self._expires(timeout)))
+        finally:
+            db.execute('COMMIT')
+        return cursor.rowcount == 1
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        row = self._db.execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time())).fetchone()
+        return default if row is None else self._load(row[0])
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        if not made:
+            return {}
+        placeholders = ', '.join('?' * len(made))
+        rows = self._db.execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires > ?)',
+            (*made, time.time())).fetchall()
+        return {made[key]: self._load(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        rows = [(self._key(key, version), self._dump(value), expires)
+                for key, value in data.items()]
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)', rows)
+            if next(self._writes) % self._cull_every == 0:
+                self._cull(db)
+        finally:
+            db.execute('COMMIT')
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), self._key(key, version), time.time()))
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = db.execute(
+                "UPDATE cache SET value = value + ? WHERE key = ? "
+                "AND typeof(value) = 'integer' "
+                "AND (expires IS NULL OR expires > ?)",
+                (delta, key, time.time()))
+            row = None
+            if cursor.rowcount:
+                row = db.execute('SELECT value FROM cache WHERE key = ?',
+                                 (key,)).fetchone()
+        finally:
+            db.execute('COMMIT')
+        if row is None:
+            raise ValueError(f"Key '{key}' not found")
+        return row[0]
+
+    def delete(self, key, version=None):
+        self._db.execute('DELETE FROM cache WHERE key = ?',
+                         (self._key(key, version),))
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.delete(key, version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, version=version) is not None
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _cull(self, db):
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        total = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if total > self._max_entries and self._cull_frequency:
+            db.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY expires IS NULL, expires '
+                'LIMIT ?)',
+                (total // self._cull_frequency,))
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами потока.
+        pass
+
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'sqlite': 'core.cache_backends.SQLiteCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'pylibmc': 'django.core.cache.backends.memcached.PyLibMCCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+# Бэкенды, которые держат не больше MAX_ENTRIES записей.
+CULLED = ('locmem', 'sqlite', 'file', 'db')
+
+
+def cache_from_url(url, base_dir, key_prefix='', version=1,
+                   max_entries=None):
+    """Строит настройку CACHES['default'] по адресу вида
+    sqlite:///var/cache/yatube.sqlite3, file:///tmp/yatube,
+    db://cache_table, memcached://127.0.0.1:11211 или redis://host/0.
+
+    Относительные пути файловых бэкендов считаются от base_dir.
+    max_entries — предел числа записей для бэкендов, которые сами
+    вытесняют записи (по умолчанию у Django их всего 300).
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in BACKENDS:
+        raise ValueError(f'Неизвестный бэкенд кэша: {url}')
+    config = {
+        'BACKEND': BACKENDS[parts.scheme],
+        'KEY_PREFIX': key_prefix,
+        'VERSION': version,
+    }
+    if max_entries is not None and parts.scheme in CULLED:
+        config['OPTIONS'] = {'MAX_ENTRIES': max_entries}
+    if parts.scheme in ('sqlite', 'file'):
+        path = (parts.netloc + parts.path) or 'cache.sqlite3'
+        config['LOCATION'] = os.path.join(base_dir, path)
+    elif parts.scheme == 'db':
+        config['LOCATION'] = parts.netloc or 'yatube_cache'
+    elif parts.scheme in ('memcached', 'pylibmc'):
+        config['LOCATION'] = parts.netloc.split(',')
+    elif parts.scheme == 'redis':
+        config['LOCATION'] = url
+    return config
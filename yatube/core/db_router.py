@@ -0,0 +1,196 @@
+"""Чтение лент с реплик базы.
+
+ReplicaRoutingMiddleware разрешает читать с реплики только GET-запросам
+к представлениям из REPLICA_READ_VIEWS; всё остальное, включая записи,
+идёт в основную базу. Реплика выбирается один раз на запрос, чтобы все
+его чтения видели один снимок данных: по кругу (round_robin) или с
+наименьшим отставанием (least_lag). Реплики, отстающие больше чем
+на REPLICA_MAX_LAG секунд, пропускаются; если подходящих нет, запрос
+читает основную базу.
+
+После любого запроса с записью (POST: пост, комментарий; GET-ссылки
+подписки и отписки помечены декоратором pin_primary) браузер получает
+cookie и следующие REPLICA_PIN_SECONDS секунд читает основную базу:
+автор сразу видит свой пост, даже если реплика ещё не догнала основную
+базу.
+
+Локально реплика — второй файл SQLite (переменная DATABASE_REPLICA),
+который команда sync_replica копирует из основного.
+"""
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+
+PIN_COOKIE: str = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_local = threading.local()
+
+
+def current():
+    """Алиас реплики текущего запроса или None для основной базы."""
+    return getattr(_local, 'alias', None)
+
+
+def measure_lag(alias: str):
+    """Отставание реплики в секундах или None, если его не узнать."""
+    connection = connections[alias]
+    try:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT COALESCE(EXTRACT(EPOCH FROM now() - '
+                    'pg_last_xact_replay_timestamp()), 0)')
+                return float(cursor.fetchone()[0])
+        if connection.vendor == 'sqlite':
+            # Копия, пропустившая записи, отстаёт на всё время с последней
+            # синхронизации. В режиме WAL запись сначала попадает в файл
+            # -wal, и mtime основного файла меняется только на контрольной
+            # точке.
+            primary = connections['default'].settings_dict['NAME']
+            replica = connection.settings_dict['NAME']
+            written = max(os.path.getmtime(path)
+                          for path in (primary, f'{primary}-wal')
+                          if os.path.exists(path))
+            synced = os.path.getmtime(replica)
+            if written <= synced:
+                return 0.0
+            return max(0.0, time.time() - synced)
+    except (DatabaseError, OSError):
+        return None
+    return 0.0
+
+
+class ReplicaSelector:
+    """Выбор реплики; замеры отставания кэшируются на
+    REPLICA_LAG_CHECK_INTERVAL секунд."""
+
+    def __init__(self, measure=measure_lag):
+        self.measure = measure
+        self._lock = threading.Lock()
+        self._cycle = None
+        self._aliases = None
+        self._lags = {}
+        self._measured = 0.0
+
+    def lags(self, aliases) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            if (now - self._measured >= settings.REPLICA_LAG_CHECK_INTERVAL
+                    or set(self._lags) != set(aliases)):
+                self._lags = {alias: self.measure(alias)
+                              for alias in aliases}
+                self._measured = now
+            return dict(self._lags)
+
+    def _next(self, aliases):
+        with self._lock:
+            if self._aliases != aliases:
+                self._aliases = aliases
+                self._cycle = itertools.cycle(aliases)
+            return next(self._cycle)
+
+    def choose(self):
+        aliases = list(settings.REPLICA_DATABASES)
+        if not aliases:
+            return None
+        if settings.REPLICA_SELECTION == 'round_robin':
+            return self._next(aliases)
+        fresh = [(lag, alias) for alias, lag in self.lags(aliases).items()
+                 if lag is not None and lag <= settings.REPLICA_MAX_LAG]
+        return min(fresh)[1] if fresh else None
+
+
+selector = ReplicaSelector()
+
+
+def use_replica() -> None:
+    _local.alias = selector.choose()
+
+
+def use_primary() -> None:
+    _local.alias = None
+
+
+def pin_primary(view):
+    """Для GET-представлений с записью: после них браузер, как после
+    POST, читает основную базу."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.pin_primary = True
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def pinned(request) -> bool:
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return current()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы: связи между ними допустимы.
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        use_primary()
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary()
+        if (request.method not in SAFE_METHODS
+                or getattr(request, 'pin_primary', False)):
+            response.set_cookie(
+                PIN_COOKIE, str(time.time() + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in SAFE_METHODS
+                and request.resolver_match.view_name
+                in settings.REPLICA_READ_VIEWS
+                and not pinned(request)):
+            use_replica()
+
+
+def sync_sqlite_replicas() -> list:
+    """Копирует основной файл SQLite в файлы реплик онлайн-бэкапом."""
+    primary = connections['default'].settings_dict['NAME']
+    synced = []
+    for alias in settings.REPLICA_DATABASES:
+        if connections[alias].vendor != 'sqlite':
+            continue
+        target = connections[alias].settings_dict['NAME']
+        connections[alias].close()
+        source = sqlite3.connect(primary)
+        destination = sqlite3.connect(target)
+        try:
+            source.backup(destination)
+        finally:
+            destination.close()
+            source.close()
+        synced.append(alias)
+    return synced
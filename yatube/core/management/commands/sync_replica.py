@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.db_router import sync_sqlite_replicas
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик '
+            '(локальная проверка чтения с реплик).')
+
+    def handle(self, *args, **options):
+        synced = sync_sqlite_replicas()
+        self.stdout.write(self.style.SUCCESS(
+            f'Реплики обновлены: {", ".join(synced) or "нет реплик"}'))
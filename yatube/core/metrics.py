@@ -0,0 +1,260 @@
+"""Метрики в формате Prometheus без внешнего агента.
+
+Каждый процесс (воркер gunicorn, thumbnail_worker) копит счётчики
+и гистограммы в памяти и не чаще раза в METRICS_FLUSH_INTERVAL секунд
+сбрасывает их в свой файл в METRICS_DIR. Представление /metrics
+складывает файлы всех процессов, поэтому показывает сумму по серверу,
+какой бы воркер ни принял запрос. Файлы завершившихся процессов
+при сборе сливаются в один finished.json и удаляются: счётчики
+не откатываются после перезапуска воркера, а файлы не копятся.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+FINISHED_FILE: str = 'finished.json'
+LOCK_FILE: str = '.lock'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+# Имя: (тип, описание, границы корзин гистограммы).
+METRICS = {
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа по имени URL.', LATENCY_BUCKETS),
+    'yatube_request_queries': (
+        'histogram', 'SQL-запросов на один ответ по имени URL.',
+        QUERY_BUCKETS),
+    'yatube_db_queries_total': (
+        'counter', 'SQL-запросы по имени URL.', None),
+    'yatube_cache_fragments_total': (
+        'counter', 'Обращения к кэшу фрагментов: hit, stale, wait, miss.',
+        None),
+    'yatube_page_cache_total': (
+        'counter', 'Страницы для гостей из кэша: hit, miss, bypass.', None),
+    'yatube_thumbnail_seconds': (
+        'histogram', 'Время генерации миниатюр одной картинки.',
+        LATENCY_BUCKETS),
+    'yatube_thumbnail_failures_total': (
+        'counter', 'Неудачные попытки генерации миниатюр.', None),
+    'yatube_writes_total': (
+        'counter', 'Записи постов, комментариев и подписок.', None),
+}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Запись файла и os.replace идут по очереди: более старый снимок
+        # не перезапишет более новый.
+        self._write_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._pid = os.getpid()
+        self._started = time.time_ns()
+        self._values = {}
+        self._flushed = 0.0
+
+    def _series(self, name: str, labels: dict):
+        if self._pid != os.getpid():
+            # Процесс форкнулся: значения родителя уже в его файле.
+            self.reset()
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self._values:
+            kind, _, buckets = METRICS[name]
+            self._values[key] = (
+                {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0,
+                 'count': 0}
+                if kind == 'histogram' else 0)
+        return key
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        if not settings.METRICS_ENABLED:
+            return
+        with self._lock:
+            key = self._series(name, labels)
+            self._values[key] += amount
+        self._maybe_flush()
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        if not settings.METRICS_ENABLED:
+            return
+        buckets = METRICS[name][2]
+        with self._lock:
+            histogram = self._values[self._series(name, labels)]
+            histogram['buckets'][bisect_left(buckets, value)] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+        self._maybe_flush()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(settings.METRICS_DIR,
+                            f'{self._pid}-{self._started}.json')
+
+    def _maybe_flush(self) -> None:
+        if time.monotonic() - self._flushed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._write_lock:
+            with self._lock:
+                if self._pid != os.getpid() or not self._values:
+                    return
+                # Гистограммы копируются: другие потоки продолжают
+                # их менять, пока снимок пишется в файл.
+                rows = [[name, dict(labels), _copy(value)]
+                        for (name, labels), value in self._values.items()]
+                self._flushed = time.monotonic()
+            _write(self.path, rows)
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return dict(value, buckets=list(value['buckets']))
+    return value
+
+
+def _write(path: str, rows: list) -> None:
+    """Атомарная запись: временный файл со своим именем и os.replace."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(
+        dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w') as output:
+            json.dump(rows, output)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+atexit.register(registry.flush)
+
+
+def _merge(total: dict, value):
+    if isinstance(value, dict):
+        total = total or {'buckets': [0] * len(value['buckets']),
+                          'sum': 0.0, 'count': 0}
+        total['buckets'] = [a + b for a, b in
+                            zip(total['buckets'], value['buckets'])]
+        total['sum'] += value['sum']
+        total['count'] += value['count']
+        return total
+    return (total or 0) + value
+
+
+def _read(path: str) -> list:
+    try:
+        with open(path) as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        return []
+
+
+def _sum(paths) -> dict:
+    merged = {}
+    for path in paths:
+        for name, labels, value in _read(path):
+            if name not in METRICS:
+                continue
+            key = (name, tuple(sorted(labels.items())))
+            merged[key] = _merge(merged.get(key), value)
+    return merged
+
+
+def _finished(path: str) -> bool:
+    """Файл процесса, которого больше нет."""
+    try:
+        pid = int(os.path.basename(path).split('-', 1)[0])
+    except ValueError:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def compact() -> None:
+    """Сливает файлы завершившихся процессов в finished.json."""
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    with open(os.path.join(settings.METRICS_DIR, LOCK_FILE), 'w') as lock:
+        # Сливать может любой процесс: блокировка не даёт двоим
+        # сложить одни и те же файлы дважды.
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        finished = [path for path in glob.glob(
+            os.path.join(settings.METRICS_DIR, '*-*.json'))
+            if _finished(path)]
+        if not finished:
+            return
+        target = os.path.join(settings.METRICS_DIR, FINISHED_FILE)
+        merged = _sum([target, *finished])
+        _write(target, [[name, dict(labels), value]
+                        for (name, labels), value in merged.items()])
+        for path in finished:
+            os.unlink(path)
+
+
+def collect() -> dict:
+    """Сумма метрик всех процессов: {(имя, метки): значение}."""
+    registry.flush()
+    compact()
+    return _sum(glob.glob(os.path.join(settings.METRICS_DIR, '*.json')))
+
+
+def _escape(value) -> str:
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _labels(labels, extra=()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"'
+                          for key, value in pairs) + '}'
+
+
+def _format_bound(bound) -> str:
+    return repr(float(bound))
+
+
+def exposition() -> str:
+    """Текстовый формат Prometheus 0.0.4."""
+    merged = collect()
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        series = sorted((labels, value) for (metric, labels), value
+                        in merged.items() if metric == name)
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series:
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            bounds = [_format_bound(bound) for bound in buckets] + ['+Inf']
+            for bound, count in zip(bounds, value['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket'
+                             f'{_labels(labels, [("le", bound)])} '
+                             f'{cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {value["sum"]}')
+            lines.append(f'{name}_count{_labels(labels)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,187 @@
+"""Замеры времени запросов.
+
+MetricsMiddleware пишет время ответа и число SQL-запросов по имени URL
+в метрики Prometheus (см. core.metrics).
+
+RequestTimingMiddleware считает для каждого запроса общее время,
+время рендера шаблонов, число SQL-запросов и их суммарное время.
+Результат уходит в заголовок Server-Timing, медленные запросы пишутся
+в лог вместе с SQL, а гистограммы по представлениям копятся в памяти
+процесса и отдаются staff-пользователям (см. core.views.request_timings).
+
+Выключенный middleware (REQUEST_TIMING = False) удаляется Django
+из цепочки при старте и ничего не стоит.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+from . import metrics
+
+logger = logging.getLogger('yatube.timing')
+
+# Верхние границы корзин гистограммы, мс; последняя корзина — всё больше.
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_local = threading.local()
+_lock = threading.Lock()
+_histograms = {}
+
+
+class RequestTiming:
+    def __init__(self):
+        self.queries = []
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self._template_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.db_time += duration
+            self.queries.append((duration, sql))
+
+
+def _timed_render(render):
+    def wrapper(self, context):
+        timing = getattr(_local, 'timing', None)
+        if timing is None:
+            return render(self, context)
+        # Вложенные {% include %} уже входят во время внешнего шаблона.
+        timing._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            timing._template_depth -= 1
+            if not timing._template_depth:
+                timing.template_time += time.perf_counter() - started
+    wrapper.timed = True
+    return wrapper
+
+
+def observe(view: str, total: float, timing: RequestTiming) -> None:
+    """Добавляет запрос в гистограмму представления."""
+    milliseconds = total * 1000
+    with _lock:
+        histogram = _histograms.setdefault(view, {
+            'count': 0, 'total_ms': 0.0, 'db_ms': 0.0, 'queries': 0,
+            'buckets': [0] * (len(BUCKETS_MS) + 1),
+        })
+        histogram['count'] += 1
+        histogram['total_ms'] += milliseconds
+        histogram['db_ms'] += timing.db_time * 1000
+        histogram['queries'] += len(timing.queries)
+        histogram['buckets'][bisect_left(BUCKETS_MS, milliseconds)] += 1
+
+
+def histograms() -> dict:
+    """Снимок гистограмм процесса: корзины подписаны границей в мс."""
+    labels = [str(bound) for bound in BUCKETS_MS] + ['+Inf']
+    with _lock:
+        return {
+            view: {
+                'count': data['count'],
+                'mean_ms': round(data['total_ms'] / data['count'], 3),
+                'mean_db_ms': round(data['db_ms'] / data['count'], 3),
+                'mean_queries': round(data['queries'] / data['count'], 2),
+                'buckets': dict(zip(labels, data['buckets'])),
+            }
+            for view, data in _histograms.items()
+        }
+
+
+def reset() -> None:
+    with _lock:
+        _histograms.clear()
+
+
+class RequestTimingMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if not getattr(Template.render, 'timed', False):
+            Template.render = _timed_render(Template.render)
+
+    def __call__(self, request):
+        timing = RequestTiming()
+        _local.timing = timing
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timing.record_query))
+                response = self.get_response(request)
+        finally:
+            _local.timing = None
+        total = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        observe(view, total, timing)
+        response['Server-Timing'] = self.server_timing(total, timing)
+        if total * 1000 >= settings.REQUEST_TIMING_SLOW_MS:
+            self.log_slow(request, view, total, timing)
+        return response
+
+    @staticmethod
+    def server_timing(total: float, timing: RequestTiming) -> str:
+        return ', '.join((
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={timing.db_time * 1000:.1f};'
+            f'desc="{len(timing.queries)} queries"',
+            f'template;dur={timing.template_time * 1000:.1f}',
+        ))
+
+    @staticmethod
+    def log_slow(request, view: str, total: float, timing: RequestTiming):
+        slowest = sorted(timing.queries, reverse=True)
+        slowest = slowest[:settings.REQUEST_TIMING_LOGGED_QUERIES]
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.1f мс, SQL: %d за %.1f мс\n%s',
+            request.method, request.get_full_path(), view, total * 1000,
+            len(timing.queries), timing.db_time * 1000,
+            '\n'.join(f'{duration * 1000:.1f} мс: {sql}'
+                      for duration, sql in slowest))
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.observe('yatube_request_duration_seconds',
+                        time.perf_counter() - started, view=view)
+        metrics.observe('yatube_request_queries', counter.count, view=view)
+        metrics.inc('yatube_db_queries_total', counter.count, view=view)
+        return response
@@ -0,0 +1,55 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+POLL_INTERVAL: float = 0.05
+
+
+def get_or_compute(key, compute, timeout, version=None, stale_timeout=None,
+                   backend=cache, name=None):
+    """Значение из кэша, пересчитываемое не более чем одним воркером.
+
+    Запись хранит версию и момент, до которого она свежая. Устаревшую
+    (по времени или по версии) запись пересчитывает тот, кто первым
+    возьмёт блокировку, а остальные в это время получают старую копию.
+    Если копии нет совсем, остальные недолго ждут результата.
+    С именем name исход обращения (hit, stale, wait, miss) попадает
+    в метрики.
+    """
+    if stale_timeout is None:
+        stale_timeout = settings.SINGLEFLIGHT_STALE_TIMEOUT
+    value, result = _get_or_compute(
+        key, compute, timeout, version, stale_timeout, backend)
+    if name is not None:
+        metrics.inc('yatube_cache_fragments_total',
+                    fragment=name, result=result)
+    return value
+
+
+def _get_or_compute(key, compute, timeout, version, stale_timeout, backend):
+    lock_key = f'{key}:lock'
+    envelope = backend.get(key)
+    if envelope is not None:
+        cached_version, fresh_until, value = envelope
+        if cached_version == version and fresh_until > time.time():
+            return value, 'hit'
+        if not backend.add(lock_key, 1, settings.SINGLEFLIGHT_LOCK_TIMEOUT):
+            return value, 'stale'
+    elif not backend.add(lock_key, 1, settings.SINGLEFLIGHT_LOCK_TIMEOUT):
+        deadline = time.time() + settings.SINGLEFLIGHT_WAIT
+        while time.time() < deadline:
+            time.sleep(POLL_INTERVAL)
+            envelope = backend.get(key)
+            if envelope is not None and envelope[0] == version:
+                return envelope[2], 'wait'
+        return compute(), 'miss'
+    try:
+        value = compute()
+        envelope = (version, time.time() + timeout, value)
+        backend.set(key, envelope, timeout + stale_timeout)
+    finally:
+        backend.delete(lock_key)
+    return value, 'miss'
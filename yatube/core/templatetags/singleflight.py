@@ -0,0 +1,52 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core.singleflight import get_or_compute
+
+register = template.Library()
+
+
+class SingleFlightCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, vary_on, version):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        timeout = int(self.timeout.resolve(context))
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        version = None
+        if self.version is not None:
+            version = self.version.resolve(context)
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        return get_or_compute(
+            key, lambda: self.nodelist.render(context), timeout, version,
+            name=self.fragment_name)
+
+
+@register.tag
+def singleflight_cache(parser, token):
+    """Как {% cache %}, но фрагмент пересчитывает один воркер,
+    а остальные пока отдают прежнюю копию.
+
+    {% singleflight_cache timeout name [var ...] [version=var] %}
+    Смена version делает копию устаревшей, но не удаляет её.
+    """
+    nodelist = parser.parse(('endsingleflight_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]} требует как минимум два аргумента.')
+    version = None
+    if tokens[-1].startswith('version='):
+        version = parser.compile_filter(tokens.pop()[len('version='):])
+    return SingleFlightCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(bit) for bit in tokens[3:]],
+        version,
+    )
@@ -0,0 +1,331 @@
+import json
+import os
+import tempfile
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import resolve, reverse
+
+from posts.models import Post
+
+from . import db_router, metrics, middleware, sqlite
+from .cache_backends import SQLiteCache, cache_from_url
+from .singleflight import get_or_compute
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {'KEY_PREFIX': 'test'})
+
+    def test_values_round_trip(self):
+        """Значения сохраняются и читаются, в том числе пачкой."""
+        self.cache.set('text', {'page': 1})
+        self.cache.set_many({'a': 1, 'b': [2]})
+        self.assertEqual(self.cache.get('text'), {'page': 1})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': [2]})
+        self.assertFalse(self.cache.add('a', 5))
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_shared_between_instances(self):
+        """Два экземпляра на одном файле видят общие ключи и версии."""
+        other = SQLiteCache(self.location, {'KEY_PREFIX': 'test'})
+        self.cache.set('version', 10, None)
+        self.assertEqual(other.incr('version'), 11)
+        self.assertEqual(self.cache.incr('version', 2), 13)
+        with self.assertRaises(ValueError):
+            other.incr('missing')
+
+    def test_expired_keys(self):
+        """Просроченный ключ считается отсутствующим."""
+        self.cache.set('old', 'value', -1)
+        self.assertIsNone(self.cache.get('old'))
+        self.assertTrue(self.cache.add('old', 'new'))
+
+    def test_cull_every_n_writes(self):
+        """Лишние записи удаляются раз в CULL_EVERY записей,
+        а не при каждой."""
+        small = SQLiteCache(self.location, {
+            'KEY_PREFIX': 'test',
+            'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2,
+                        'CULL_EVERY': 10},
+        })
+        for number in range(9):
+            small.set(f'key{number}', number)
+        self.assertEqual(len(small.get_many(
+            [f'key{number}' for number in range(9)])), 9)
+        small.set('key9', 9)
+        self.assertEqual(len(small.get_many(
+            [f'key{number}' for number in range(10)])), 5)
+
+    def test_cache_from_url(self):
+        """Адрес кэша превращается в настройку бэкенда."""
+        config = cache_from_url('sqlite://cache.sqlite3', '/srv/yatube',
+                                max_entries=1000)
+        self.assertEqual(config['LOCATION'], '/srv/yatube/cache.sqlite3')
+        self.assertEqual(config['OPTIONS'], {'MAX_ENTRIES': 1000})
+        config = cache_from_url('memcached://a:11211,b:11211', '/srv',
+                                max_entries=1000)
+        self.assertEqual(config['LOCATION'], ['a:11211', 'b:11211'])
+        self.assertNotIn('OPTIONS', config)
+        with self.assertRaises(ValueError):
+            cache_from_url('unknown://', '/srv')
+
+
+@override_settings(SINGLEFLIGHT_WAIT=0)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = LocMemCache('singleflight', {})
+        self.cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'value{self.calls}'
+
+    def get(self, version=1):
+        return get_or_compute('key', self.compute, 60, version,
+                              backend=self.cache)
+
+    def test_fresh_value_is_reused(self):
+        """Свежая копия не пересчитывается."""
+        self.assertEqual(self.get(), 'value1')
+        self.assertEqual(self.get(), 'value1')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_while_recomputing(self):
+        """Пока другой воркер держит блокировку, отдаётся старая копия."""
+        self.get()
+        self.cache.add('key:lock', 1)
+        self.assertEqual(self.get(version=2), 'value1')
+        self.cache.delete('key:lock')
+        self.assertEqual(self.get(version=2), 'value2')
+        self.assertEqual(self.calls, 2)
+
+
+@override_settings(REQUEST_TIMING=True)
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        middleware.reset()
+
+    def test_server_timing(self):
+        """Ответ несёт Server-Timing, запрос попадает в гистограмму."""
+        response = Client().get(reverse('posts:index'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('template;dur=', response['Server-Timing'])
+        histogram = middleware.histograms()['posts:index']
+        self.assertEqual(histogram['count'], 1)
+        self.assertGreater(histogram['mean_queries'], 0)
+
+    @override_settings(REQUEST_TIMING_SLOW_MS=0)
+    def test_slow_request_logged(self):
+        """Медленный запрос пишется в лог вместе с SQL."""
+        with self.assertLogs('yatube.timing', 'WARNING') as logs:
+            Client().get(reverse('posts:index'))
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_timings_for_staff_only(self):
+        """Гистограммы видны только staff-пользователям."""
+        url = reverse('request_timings')
+        self.assertEqual(Client().get(url).status_code, 302)
+        staff = get_user_model().objects.create_user(
+            username='staff', is_staff=True)
+        client = Client()
+        client.force_login(staff)
+        client.get(reverse('posts:index'))
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('posts:index', response.json())
+
+    @override_settings(REQUEST_TIMING=False)
+    def test_disabled(self):
+        """Выключенный middleware не добавляет заголовок."""
+        response = Client().get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(METRICS_DIR=self.directory,
+                                     METRICS_FLUSH_INTERVAL=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        metrics.registry.reset()
+        cache.clear()
+
+    @override_settings(PAGE_CACHE=False)
+    def test_request_and_cache_metrics(self):
+        """Время ответа и исход обращения к кэшу ленты видны в /metrics."""
+        client = Client()
+        client.get(reverse('posts:index'))
+        client.get(reverse('posts:index'))
+        text = client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            text)
+        self.assertIn('yatube_cache_fragments_total'
+                      '{fragment="index_page",result="miss"} 1', text)
+        self.assertIn('yatube_cache_fragments_total'
+                      '{fragment="index_page",result="hit"} 1', text)
+        self.assertIn('# TYPE yatube_db_queries_total counter', text)
+
+    def test_other_processes_are_summed(self):
+        """Файлы других процессов складываются со своими значениями."""
+        author = get_user_model().objects.create_user(username='writer')
+        Post.objects.create(author=author, text='Текст')
+        labels = {'action': 'create', 'model': 'post'}
+        with open(os.path.join(self.directory, '1-1.json'), 'w') as other:
+            json.dump([['yatube_writes_total', labels, 2]], other)
+        self.assertEqual(
+            metrics.collect()[('yatube_writes_total',
+                               tuple(labels.items()))], 3)
+
+    def test_concurrent_flushes(self):
+        """Потоки сбрасывают метрики одновременно без ошибок."""
+        errors = []
+
+        def flush():
+            try:
+                for _ in range(50):
+                    metrics.inc('yatube_writes_total', model='post',
+                                action='create')
+                    metrics.registry.flush()
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=flush) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(metrics.collect()[(
+            'yatube_writes_total',
+            (('action', 'create'), ('model', 'post')))], 200)
+
+    def test_finished_processes_compacted(self):
+        """Файлы завершившихся процессов сливаются в один,
+        сумма при этом не меняется."""
+        labels = {'action': 'delete', 'model': 'post'}
+        key = ('yatube_writes_total', tuple(labels.items()))
+        for started in (1, 2):
+            path = os.path.join(self.directory, f'999999999-{started}.json')
+            with open(path, 'w') as other:
+                json.dump([['yatube_writes_total', labels, 2]], other)
+        self.assertEqual(metrics.collect()[key], 4)
+        self.assertEqual(os.listdir(self.directory).count(
+            metrics.FINISHED_FILE), 1)
+        self.assertFalse(any(name.startswith('999999999-')
+                             for name in os.listdir(self.directory)))
+        self.assertEqual(metrics.collect()[key], 4)
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    def tearDown(self):
+        db_router.use_primary()
+
+    @override_settings(REPLICA_DATABASES=['first', 'second'],
+                       REPLICA_SELECTION='round_robin')
+    def test_round_robin(self):
+        """Реплики выбираются по кругу."""
+        selector = db_router.ReplicaSelector()
+        self.assertEqual([selector.choose() for _ in range(3)],
+                         ['first', 'second', 'first'])
+
+    @override_settings(REPLICA_DATABASES=['first', 'second'],
+                       REPLICA_SELECTION='least_lag', REPLICA_MAX_LAG=5)
+    def test_least_lag(self):
+        """Выбирается наименее отстающая реплика; слишком отставшие
+        и недоступные пропускаются."""
+        lags = {'first': 3.0, 'second': 0.5}
+        self.assertEqual(
+            db_router.ReplicaSelector(lags.get).choose(), 'second')
+        lags = {'first': None, 'second': 60.0}
+        self.assertIsNone(db_router.ReplicaSelector(lags.get).choose())
+
+    @override_settings(REPLICA_DATABASES=['default'],
+                       REPLICA_SELECTION='round_robin')
+    def test_reads_pinned_after_write(self):
+        """Ленты читаются с реплики, пока браузер не сделал запись."""
+        routing = db_router.ReplicaRoutingMiddleware(
+            lambda request: HttpResponse())
+        router = db_router.ReplicaRouter()
+        factory = RequestFactory()
+
+        def route(request):
+            request.resolver_match = resolve(request.path)
+            routing.process_view(request, None, (), {})
+            return router.db_for_read(Post)
+
+        self.assertEqual(route(factory.get('/')), 'default')
+        db_router.use_primary()
+        self.assertIsNone(route(factory.get(reverse('posts:post_create'))))
+        response = routing(factory.post(reverse('posts:post_create')))
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+        self.assertIsNone(db_router.current())
+        factory.cookies = response.cookies
+        self.assertIsNone(route(factory.get('/')))
+        self.assertEqual(router.db_for_write(Post), 'default')
+
+    @override_settings(REPLICA_DATABASES=['default'])
+    def test_get_write_pins_primary(self):
+        """GET-представление с записью (подписка) тоже закрепляет
+        браузер за основной базой."""
+        routing = db_router.ReplicaRoutingMiddleware(
+            db_router.pin_primary(lambda request: HttpResponse()))
+        response = routing(RequestFactory().get('/'))
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+
+    def test_sqlite_lag_counts_wal(self):
+        """Реплика, пропустившая запись (и в файл -wal), отстаёт на всё
+        время с последней синхронизации, а не догнавшая — не отстаёт."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        paths = {name: os.path.join(directory.name, name)
+                 for name in ('primary', 'primary-wal', 'replica')}
+        for path in paths.values():
+            open(path, 'w').close()
+        os.utime(paths['primary'], (100, 100))
+        os.utime(paths['replica'], (100, 100))
+        os.utime(paths['primary-wal'], (130, 130))
+        fake = {
+            alias: SimpleNamespace(vendor='sqlite',
+                                   settings_dict={'NAME': paths[name]})
+            for alias, name in (('default', 'primary'),
+                                ('replica', 'replica'))
+        }
+        with mock.patch.object(db_router, 'connections', fake), \
+                mock.patch.object(db_router.time, 'time', return_value=200):
+            self.assertEqual(db_router.measure_lag('replica'), 100.0)
+            os.utime(paths['replica'], (140, 140))
+            self.assertEqual(db_router.measure_lag('replica'), 0.0)
+
+
+class SQLitePragmaTests(TestCase):
+    # synchronous нельзя менять внутри транзакции теста.
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234,
+                                       'cache_size': -2048})
+    def test_pragmas_applied(self):
+        """PRAGMA профиля выполняются на соединении."""
+        sqlite.apply_pragmas(None, connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 1234)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -2048)
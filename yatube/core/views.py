@@ -1,5 +1,9 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
 
+from . import metrics, middleware
+
 
 def csrf_failure(request, reason=''):
     """Перенаправление в шаблон при получениии из-за
@@ -15,3 +19,16 @@ def page_not_found(request, exception):
 def server_error(request):
     """Перенаправление в шаблон при ошибках сервера"""
     return render(request, 'core/500.html', status=500)
+
+
+@staff_member_required
+def request_timings(request):
+    """Гистограммы времени ответа по представлениям этого процесса."""
+    return JsonResponse(middleware.histograms(),
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def metrics_view(request):
+    """Метрики всех процессов сервера в текстовом формате Prometheus."""
+    return HttpResponse(metrics.exposition(),
+                        content_type='text/plain; version=0.0.4')
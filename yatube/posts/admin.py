@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Follow, Group, Post
 
 
@@ -12,6 +13,14 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE '%q%'."""
+        if not search_term or not search.fts_available():
+            return super().get_search_results(
+                request, queryset, search_term)
+        ids = search.matching_ids(search_term)
+        return queryset.filter(pk__in=ids), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -0,0 +1,58 @@
+"""ETag для HTML-страниц постов.
+
+ETag собирается из версий областей feed_cache, которые сигналы сдвигают
+при каждой записи (комментарий сдвигает ленты с карточкой поста, см.
+feed_cache.card_changed), и из пользователя: шапка, кнопка подписки
+и форма комментария у каждого свои. Вычисление стоит запроса по индексу
+и обращения к кэшу, поэтому на If-None-Match страница отвечает 304
+без рендера шаблона и без чтения постов.
+
+Last-Modified эти страницы не отдают: свежий pub_date не меняется
+ни при удалении поста, ни при его правке, и If-Modified-Since отвечал бы
+304 на устаревшую страницу.
+"""
+import hashlib
+
+from django.contrib.auth import get_user_model
+
+from . import feed_cache
+from .models import Group
+
+User = get_user_model()
+
+
+def _etag(request, *parts) -> str:
+    user = request.user.pk if request.user.is_authenticated else 'anonymous'
+    raw = '|'.join(str(part) for part in (*parts, user,
+                                          request.GET.urlencode()))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def group_etag(request, slug: str):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    if group_id is None:
+        return None
+    return _etag(request, feed_cache.get_versions(
+        feed_cache.group_scope(group_id), feed_cache.groups_scope()))
+
+
+def profile_etag(request, username: str):
+    stats = User.objects.filter(username=username).values_list(
+        'pk', 'stats__posts_count', 'stats__followers_count',
+        'stats__following_count',
+    ).first()
+    if stats is None:
+        return None
+    # Строки счётчиков может ещё не быть: тогда все они нулевые.
+    stats = (stats[0], *(count or 0 for count in stats[1:]))
+    scopes = [feed_cache.author_scope(stats[0]), feed_cache.groups_scope()]
+    if request.user.is_authenticated:
+        # Подписка и отписка сдвигают версию ленты подписчика.
+        scopes.append(feed_cache.follow_scope(request.user.pk))
+    return _etag(request, feed_cache.get_versions(*scopes), *stats)
+
+
+def post_etag(request, post_id: int):
+    return _etag(request, feed_cache.get_versions(
+        feed_cache.post_scope(post_id), feed_cache.groups_scope()))
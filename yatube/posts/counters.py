@@ -0,0 +1,88 @@
+from django.db import connection
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def _add(queryset, field: str, delta: int) -> int:
+    value = F(field) + delta
+    if delta < 0:
+        # Разошедшийся счётчик не должен уходить ниже нуля
+        # и ронять запись на CHECK; точное значение вернёт recount.
+        value = Greatest(value, 0)
+    return queryset.update(**{field: value})
+
+
+def bump_user(user_id: int, field: str, delta: int) -> None:
+    """Изменяет счётчик пользователя, при первом изменении создаёт строку."""
+    if _add(UserStats.objects.filter(user_id=user_id), field, delta):
+        return
+    if delta > 0:
+        UserStats.objects.get_or_create(user_id=user_id)
+        _add(UserStats.objects.filter(user_id=user_id), field, delta)
+
+
+def bump_group(group_id, delta: int) -> None:
+    if group_id is not None:
+        _add(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def bump_post(post_id: int, delta: int) -> None:
+    _add(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def post_created(post: Post, delta: int = 1) -> None:
+    bump_user(post.author_id, 'posts_count', delta)
+    bump_group(post.group_id, delta)
+
+
+def post_moved(old_group_id, new_group_id) -> None:
+    """Пост перенесён из одной группы в другую при редактировании."""
+    if old_group_id != new_group_id:
+        bump_group(old_group_id, -1)
+        bump_group(new_group_id, 1)
+
+
+def follow_created(follow: Follow, delta: int = 1) -> None:
+    bump_user(follow.user_id, 'following_count', delta)
+    bump_user(follow.author_id, 'followers_count', delta)
+
+
+def stats_for(user) -> UserStats:
+    """Счётчики пользователя; для пользователя без строки — нулевые."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return UserStats(user=user)
+
+
+def _count(queryset, field: str):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def recount() -> None:
+    """Пересчитывает все счётчики по исходным таблицам."""
+    # Django 2.2 не ограничивает явный batch_size пределами SQLite.
+    fields = [field for field in UserStats._meta.concrete_fields
+              if not field.primary_key]
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk)
+         for pk in User.objects.values_list('pk', flat=True).iterator()),
+        batch_size=min(1000, connection.ops.bulk_batch_size(fields, [])),
+        ignore_conflicts=True,
+    )
+    UserStats.objects.update(
+        posts_count=_count(Post.objects, 'author'),
+        followers_count=_count(Follow.objects, 'author'),
+        following_count=_count(Follow.objects, 'user'),
+    )
+    Group.objects.update(posts_count=_count(Post.objects, 'group'))
+    Post.objects.update(comments_count=_count(Comment.objects, 'post'))
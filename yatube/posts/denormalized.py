@@ -0,0 +1,21 @@
+"""Перестройка того, что обычно поддерживают сигналы.
+
+Массовая загрузка через bulk_create (seed_yatube, import_yatube)
+сигналов не вызывает, поэтому после неё заново считаются счётчики,
+поисковый индекс и ленты подписок, а общий кэш очищается.
+"""
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+
+COMMANDS = ('recount', 'rebuild_search_index', 'backfill_timelines')
+
+
+def rebuild(report=None) -> None:
+    report = report or (lambda message: None)
+    for command in COMMANDS:
+        report(f'{command}...')
+        call_command(command, stdout=StringIO())
+    # Версии областей кэша лент не знают о загруженных строках.
+    cache.clear()
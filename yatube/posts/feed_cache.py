@@ -0,0 +1,136 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from . import timeline
+from .models import Follow, Post
+
+VERSION_KEY: str = 'feed-version:{}'
+
+
+def index_scope() -> str:
+    return 'index'
+
+
+def groups_scope() -> str:
+    # Карточки постов во всех лентах выводят название и slug группы.
+    return 'groups'
+
+
+def group_scope(group_id: int) -> str:
+    return f'group:{group_id}'
+
+
+def author_scope(author_id: int) -> str:
+    return f'author:{author_id}'
+
+
+def follow_scope(user_id: int) -> str:
+    return f'follow:{user_id}'
+
+
+def post_scope(post_id: int) -> str:
+    return f'post:{post_id}'
+
+
+def page_scope(path: str) -> str:
+    return f'page:{path}'
+
+
+def _initial_version() -> int:
+    # Версия после вытеснения ключа из кэша не должна совпасть
+    # ни с одной из уже выданных, поэтому начинаем с текущего времени.
+    return time.time_ns() // 1000
+
+
+def get_versions(*scopes) -> str:
+    """Версия ленты, составленная из версий всех её областей."""
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump(*scopes) -> None:
+    """Сдвигает версии областей: все фрагменты с ними устаревают."""
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+
+def fragment(*scopes, posts=None) -> dict:
+    """Параметры {% cache %} для фрагмента ленты в контексте шаблона.
+
+    posts — уже прочитанные посты страницы: их версии входят в ключ,
+    и фрагмент устаревает вместе с любой своей карточкой.
+    """
+    version = get_versions(*scopes)
+    if posts is not None:
+        cards = ','.join(f'{post.pk}:{post.version}' for post in posts)
+        version += '.' + hashlib.md5(cards.encode()).hexdigest()
+    return {
+        'timeout': settings.FEED_CACHE_TIMEOUT,
+        'version': version,
+    }
+
+
+def bump_card(post) -> None:
+    """Новая версия карточки поста: её кэш устаревает."""
+    Post.objects.filter(pk=post.pk).update(version=F('version') + 1)
+
+
+def card_changed(post) -> None:
+    """Карточка поста изменилась (комментарий, миниатюра): устаревают
+    её кэш и ленты с ней, иначе закэшированная страница ленты покажет
+    старую карточку.
+
+    Ленты подписок не сдвигаются: их ключ содержит версии карточек
+    страницы, так что комментарий стоит одинаково при любом числе
+    подписчиков автора.
+    """
+    bump_card(post)
+    bump(*_feed_scopes(post))
+
+
+def author_renamed(author_id: int) -> None:
+    """Имя автора выводится в карточках всех его постов.
+
+    Ключ карточки уже содержит имя, устаревают ленты вокруг неё:
+    область групп входит в главную, профили и подписки, ленты групп
+    зависят только от своей области.
+    """
+    group_ids = Post.objects.filter(
+        author_id=author_id, group__isnull=False,
+    ).values_list('group_id', flat=True).distinct()
+    bump(groups_scope(), author_scope(author_id),
+         *(group_scope(group_id) for group_id in group_ids))
+
+
+def _feed_scopes(post) -> list:
+    scopes = [index_scope(), author_scope(post.author_id),
+              post_scope(post.pk)]
+    if post.group_id is not None:
+        scopes.append(group_scope(post.group_id))
+    return scopes
+
+
+def post_changed(post) -> None:
+    """Пост создан, изменён или удалён: устаревают все ленты с ним,
+    включая ленты подписчиков, ETag которых в API зависит от них."""
+    scopes = _feed_scopes(post)
+    if not timeline.is_celebrity(post.author_id):
+        # Ленты подписчиков знаменитости зависят от версии автора.
+        followers = Follow.objects.filter(
+            author_id=post.author_id).values_list('user_id', flat=True)
+        scopes.extend(
+            follow_scope(user_id) for user_id in followers.iterator())
+    bump(*scopes)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Заполняет материализованные ленты подписок по таблице Follow.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='Заполнить ленту только этого пользователя.')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить существующие записи лент перед заполнением.')
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.order_by('pk')
+        entries = TimelineEntry.objects.all()
+        if options['user']:
+            follows = follows.filter(user__username=options['user'])
+            entries = entries.filter(user__username=options['user'])
+        if options['clear']:
+            entries.delete()
+        processed = 0
+        for user_id, author_id in follows.values_list(
+                'user_id', 'author_id').iterator():
+            timeline.backfill(user_id, author_id)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано подписок: {processed}, '
+            f'записей в лентах: {TimelineEntry.objects.count()}'))
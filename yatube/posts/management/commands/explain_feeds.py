@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import query_plans
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Показывает планы запросов лент и сообщает о полных '
+            'просмотрах таблиц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Выводить планы целиком.')
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Завершаться с ошибкой, если найден полный просмотр.')
+
+    def _sample_ids(self) -> dict:
+        follow = Follow.objects.order_by('pk').first()
+        post = Post.objects.order_by('pk').first()
+        group = Group.objects.order_by('pk').first()
+        return {
+            'user_id': follow.user_id if follow else 0,
+            'author_id': follow.author_id if follow else 0,
+            'group_id': group.pk if group else 0,
+            'post_id': post.pk if post else 0,
+        }
+
+    def handle(self, *args, **options):
+        scanned = []
+        queries = query_plans.feed_queries(**self._sample_ids())
+        for name, queryset in queries.items():
+            plan = queryset.explain()
+            scans = query_plans.full_scans(plan)
+            if scans:
+                scanned.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: полный просмотр'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: индекс'))
+            for line in scans:
+                self.stdout.write(f'    {line}')
+            for line in query_plans.sorts(plan):
+                self.stdout.write(self.style.WARNING(
+                    f'    сортировка: {line}'))
+            if options['verbose_plans']:
+                self.stdout.write(plan)
+        if scanned and options['strict']:
+            raise CommandError(
+                'Полный просмотр таблиц: ' + ', '.join(scanned))
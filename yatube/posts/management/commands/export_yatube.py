@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import CODECS, FORMATS, TABLES, Exporter
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в каталог: '
+            'по файлу NDJSON или CSV на таблицу. Прерванная выгрузка '
+            'продолжается с последней записанной пачки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--compress', choices=list(CODECS),
+                            default='none')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Строк в одной пачке.')
+        parser.add_argument('--tables', nargs='+',
+                            choices=[table.name for table in TABLES],
+                            help='Только эти таблицы.')
+
+    def handle(self, *args, **options):
+        names = options['tables']
+        tables = [table for table in TABLES
+                  if names is None or table.name in names]
+        try:
+            Exporter(options['directory'], fmt=options['format'],
+                     codec=options['compress'],
+                     batch_size=options['batch_size'],
+                     report=self.stdout.write).run(tables)
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS('Выгрузка завершена'))
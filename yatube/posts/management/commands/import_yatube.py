@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import TABLES, Importer
+
+
+class Command(BaseCommand):
+    help = ('Загружает каталог, созданный export_yatube. Повторный запуск '
+            'продолжает загрузку с последней записанной пачки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Строк в одной транзакции.')
+        parser.add_argument('--tables', nargs='+',
+                            choices=[table.name for table in TABLES],
+                            help='Только эти таблицы.')
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не пересчитывать счётчики, поиск и ленты подписок.')
+
+    def handle(self, *args, **options):
+        names = options['tables']
+        tables = [table for table in TABLES
+                  if names is None or table.name in names]
+        try:
+            Importer(options['directory'], batch_size=options['batch_size'],
+                     report=self.stdout.write).run(
+                tables, rebuild=not options['skip_rebuild'])
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена'))
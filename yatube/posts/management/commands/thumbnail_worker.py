@@ -0,0 +1,41 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Генерирует миниатюры картинок постов из очереди.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать очередь и завершиться.')
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Поставить в очередь все посты, у которых нет миниатюры.')
+
+    def handle(self, *args, **options):
+        if options['missing']:
+            self.enqueue_missing()
+        thumbnails.run_worker(
+            options['processes'], options['batch_size'],
+            once=options['once'], report=self.report)
+
+    def enqueue_missing(self):
+        geometry = settings.POST_THUMBNAIL_SIZES[0]
+        posts = Post.objects.exclude(image='').only('image')
+        for post in posts.iterator():
+            if thumbnails.lookup(post.image, geometry) is None:
+                thumbnails.enqueue(post)
+
+    def report(self, count, timings):
+        self.stdout.write(
+            f'Обработано заданий: {count}, успешно: {len(timings)}, '
+            f'время: {sum(timings):.2f} с')
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    """Ленты подписок из 0011 созданы пустыми, а follow_index читает
+    только их: раскладываем посты по существующим подпискам, как команда
+    backfill_timelines. Счётчики подписчиков уже заполнены в 0018."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    UserStats = apps.get_model('posts', 'UserStats')
+    celebrities = set(UserStats.objects.filter(
+        followers_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+    ).values_list('user_id', flat=True))
+    # Django 2.2 не ограничивает явный batch_size пределами SQLite.
+    batch_size = min(
+        settings.TIMELINE_BATCH_SIZE,
+        schema_editor.connection.ops.bulk_batch_size(
+            ['user_id', 'post_id', 'author_id', 'pub_date'], []))
+    follows = Follow.objects.exclude(
+        author_id__in=celebrities).order_by('pk').values_list(
+        'user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        posts = Post.objects.filter(author_id=author_id).values_list(
+            'pk', 'pub_date')
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(user_id=user_id, post_id=pk,
+                           author_id=author_id, pub_date=pub_date)
+             for pk, pub_date in posts.iterator()),
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_recount_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
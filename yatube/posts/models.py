@@ -5,18 +5,58 @@ User = get_user_model()
 
 TEXT_LENGTH_LIMITER: int = 15
 
+# Поля поста, которые выводят шаблоны лент.
+FEED_FIELDS: tuple = (
+    'text', 'pub_date', 'image', 'comments_count', 'version',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug', 'group__title',
+)
 
-class Group(models.Model):
+
+class CountersModel(models.Model):
+    """Модель со счётчиками, которые меняются только UPDATE с F().
+
+    Обычный save() уже сохранённой строки их не пишет: экземпляр,
+    загруженный до чужого F()-обновления, вернул бы в базу старое
+    значение, и версия карточки повторилась бы.
+    """
+    counter_fields: tuple = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields]
+        super().save(*args, **kwargs)
+
+
+class Group(CountersModel):
     """Создание модели для таблицы Сообщества."""
     title = models.CharField(max_length=200, verbose_name='Группа')
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество постов')
+
+    counter_fields = ('posts_count',)
 
     def __str__(self):
         return self.title
 
 
-class Post(models.Model):
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа одним запросом,
+        без полей, которые шаблоны не выводят."""
+        return self.select_related('author', 'group').only(*FEED_FIELDS)
+
+
+class Post(CountersModel):
     text = models.TextField(
         verbose_name='Текст поста',
         help_text='Введите текст поста')
@@ -40,11 +80,26 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество комментариев')
+    # Растёт при каждом изменении карточки поста: ключ её кэша.
+    version = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Версия')
+
+    objects = PostQuerySet.as_manager()
+    counter_fields = ('comments_count', 'version')
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='post_pub_date'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date'),
+        ]
 
     def __str__(self):
         return self.text[:TEXT_LENGTH_LIMITER]
@@ -64,6 +119,13 @@ class Comment(models.Model):
                                on_delete=models.CASCADE,
                                related_name='comments')
 
+    class Meta:
+        indexes = [
+            # Комментарии поста листаются по (created, id).
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created'),
+        ]
+
     def __str__(self):
         return self.text[:TEXT_LENGTH_LIMITER]
 
@@ -75,3 +137,74 @@ class Follow(models.Model):
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
                                related_name='following')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='stats')
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество постов')
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество подписчиков')
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество подписок')
+
+    def __str__(self):
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост в ленте читателя."""
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_post'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='timeline_user_pub_date'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author'),
+        ]
+
+
+class ThumbnailJob(models.Model):
+    """Очередь генерации миниатюр картинки поста."""
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='thumbnail_jobs')
+    image = models.CharField(max_length=255)
+    created = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ('pk',)
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'image'],
+                                    name='unique_thumbnail_job'),
+        ]
+
+    def __str__(self):
+        return self.image
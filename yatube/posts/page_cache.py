@@ -0,0 +1,133 @@
+"""Готовые страницы лент и постов для гостей.
+
+AnonymousPageCacheMiddleware отдаёт GET-запросы гостей к представлениям
+из PAGE_CACHE_VIEWS прямо из общего кэша: без сессии, ORM и шаблонов.
+Гостем считается запрос без cookie сессии и сообщений. В кэш попадают
+только ответы 200 без Set-Cookie и без Cache-Control: private/no-store,
+так что страница с чужим CSRF-токеном туда не попадёт.
+
+Ключ — хост, путь с параметрами и версия страницы, составленная
+из версии пути и версии групп (см. posts.feed_cache). Сигналы при записи
+поста, комментария или подписки сдвигают версии путей, на которых
+запись видна, а правка или удаление группы — версию групп, то есть всех
+страниц сразу. Все ?page= одного пути устаревают вместе с ним.
+
+Прокси ниже по цепочке получают Cache-Control: public, max-age
+PAGE_CACHE_MAX_AGE и Vary: Cookie: сбросить их копии нельзя, поэтому
+срок короткий. Страницы пользователей с сессией помечаются private.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve, reverse
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import parse_http_date_safe
+
+from core import metrics
+
+from . import feed_cache
+from .models import Group
+
+CACHE_KEY: str = 'page:{}:{}:{}'
+HEADER: str = 'X-Page-Cache'
+
+
+def _is_guest(request) -> bool:
+    return not any(name in request.COOKIES for name in (
+        settings.SESSION_COOKIE_NAME, CookieStorage.cookie_name))
+
+
+def _cache_key(request) -> str:
+    full_path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    version = feed_cache.get_versions(
+        feed_cache.page_scope(request.path), feed_cache.groups_scope())
+    return CACHE_KEY.format(request.get_host(), full_path, version)
+
+
+def _cacheable(response) -> bool:
+    cache_control = response.get('Cache-Control', '')
+    return (response.status_code == 200 and not response.streaming
+            and not response.cookies
+            and 'private' not in cache_control
+            and 'no-store' not in cache_control)
+
+
+def _not_modified(request, response):
+    """304 на If-None-Match или If-Modified-Since к готовой странице."""
+    return get_conditional_response(
+        request, etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(
+            response.get('Last-Modified', '')),
+        response=response)
+
+
+def post_paths(post, old_group_id=None) -> list:
+    """Страницы, на которых виден пост: лента, группа, профиль, пост.
+
+    old_group_id — группа, из которой пост только что перенесли:
+    её страница ещё показывает пост.
+    """
+    paths = [
+        reverse('posts:index'),
+        reverse('posts:profile', kwargs={'username': post.author.username}),
+        reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+    ]
+    group_ids = {post.group_id, old_group_id} - {None}
+    paths.extend(
+        reverse('posts:group_list', kwargs={'slug': slug})
+        for slug in Group.objects.filter(
+            pk__in=group_ids).values_list('slug', flat=True))
+    return paths
+
+
+def follow_paths(follow) -> list:
+    """Профили с числом подписчиков и подписок, изменённым подпиской."""
+    return [reverse('posts:profile', kwargs={'username': user.username})
+            for user in (follow.user, follow.author)]
+
+
+def purge(*paths) -> None:
+    """Все закэшированные варианты путей устаревают."""
+    feed_cache.bump(*(feed_cache.page_scope(path) for path in paths))
+
+
+class AnonymousPageCacheMiddleware:
+    def __init__(self, get_response):
+        if not settings.PAGE_CACHE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return self.get_response(request)
+        view = match.view_name
+        if view not in settings.PAGE_CACHE_VIEWS or request.method != 'GET':
+            return self.get_response(request)
+        if not _is_guest(request):
+            response = self.get_response(request)
+            patch_cache_control(response, private=True)
+            metrics.inc('yatube_page_cache_total', view=view, result='bypass')
+            return response
+        key = _cache_key(request)
+        response = cache.get(key)
+        if response is not None:
+            # Представление не вызывается: имя URL для метрик ставим сами.
+            request.resolver_match = match
+            metrics.inc('yatube_page_cache_total', view=view, result='hit')
+            response[HEADER] = 'hit'
+            return _not_modified(request, response)
+        response = self.get_response(request)
+        if _cacheable(response):
+            patch_cache_control(response, public=True,
+                                max_age=settings.PAGE_CACHE_MAX_AGE)
+            patch_vary_headers(response, ('Cookie',))
+            cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+        metrics.inc('yatube_page_cache_total', view=view, result='miss')
+        response[HEADER] = 'miss'
+        return response
@@ -0,0 +1,249 @@
+import base64
+import binascii
+import hashlib
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from core.singleflight import get_or_compute
+
+CURSOR_PARAM: str = 'cursor'
+NEXT: str = 'n'
+PREVIOUS: str = 'p'
+COUNT_CACHE_KEY: str = 'paginator-count:{}'
+# Окно ссылок на страницы: номера вокруг текущей и у краёв ленты.
+PAGES_ON_EACH_SIDE: int = 3
+PAGES_ON_ENDS: int = 1
+
+
+def encode_cursor(direction: str, pub_date, pk: int) -> str:
+    """Упаковывает позицию в ленте в непрозрачный токен для ?cursor=."""
+    raw = f'{direction}|{pub_date.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str):
+    """Возвращает (направление, pub_date, pk) или None для битого токена."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+def comment_page(queryset, token, limit: int) -> tuple:
+    """Комментарии от старых к новым после курсора и курсор следующей
+    порции или None. Keyset по (created, id) читает порцию по индексу
+    на любой глубине."""
+    rows = queryset.order_by('created', 'pk')
+    position = decode_cursor(token) if token else None
+    if position is not None and position[0] == NEXT:
+        _, created, pk = position
+        rows = rows.filter(
+            Q(created__gt=created) | Q(created=created, pk__gt=pk))
+    comments = list(rows[:limit + 1])
+    if len(comments) <= limit:
+        return comments, None
+    comments = comments[:limit]
+    last = comments[-1]
+    return comments, encode_cursor(NEXT, last.created, last.pk)
+
+
+def page_window(page, on_each_side: int = PAGES_ON_EACH_SIDE,
+                on_ends: int = PAGES_ON_ENDS) -> list:
+    """Номера страниц для навигации: окно вокруг текущей и края ленты,
+    пропуски обозначены None. Длина не зависит от числа страниц."""
+    number = page.number
+    last = page.paginator.num_pages
+    middle = range(max(1, number - on_each_side),
+                   min(last, number + on_each_side) + 1)
+    numbers = sorted({*range(1, min(on_ends, last) + 1), *middle,
+                      *range(max(1, last - on_ends + 1), last + 1)})
+    window = []
+    for current in numbers:
+        if window and current - window[-1] > 1:
+            window.append(None)
+        window.append(current)
+    return window
+
+
+def _table_estimate(connection, table: str):
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+                rows = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+                return max(rows) if rows else None
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE oid = %s::regclass', [table])
+                row = cursor.fetchone()
+                # -1: таблицу ещё не анализировали.
+                return row[0] if row and row[0] >= 0 else None
+    except DatabaseError:
+        return None
+    return None
+
+
+def table_estimate(queryset):
+    """Оценка числа строк таблицы из статистики планировщика:
+    sqlite_stat1 (после ANALYZE) или reltuples PostgreSQL.
+    Статистика меняется редко, поэтому тоже кэшируется."""
+    table = queryset.model._meta.db_table
+    return get_or_compute(
+        COUNT_CACHE_KEY.format(table),
+        lambda: _table_estimate(connections[queryset.db], table),
+        settings.PAGINATOR_COUNT_TIMEOUT)
+
+
+class ApproximatePaginator(Paginator):
+    """Paginator без точного COUNT(*) на каждый запрос.
+
+    Число записей берётся из поддерживаемого счётчика (count),
+    для ленты без фильтров — из статистики таблицы, иначе — COUNT(*)
+    из кэша, который пересчитывает один воркер, пока остальные получают
+    старое значение. Если получилось меньше PAGINATOR_EXACT_COUNT_BELOW,
+    считается точно: на небольших лентах COUNT(*) дёшев, а номер
+    последней страницы должен быть верным.
+    """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.known_count = count
+        self.approximate = False
+
+    def _cached_count(self) -> tuple:
+        """(COUNT(*) из кэша, посчитан ли он только что)."""
+        queryset = self.object_list
+        counted = []
+
+        def compute():
+            counted.append(True)
+            return queryset.count()
+
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.md5(f'{sql}|{params!r}'.encode()).hexdigest()
+        value = get_or_compute(COUNT_CACHE_KEY.format(digest), compute,
+                               settings.PAGINATOR_COUNT_TIMEOUT,
+                               name='paginator_count')
+        return value, bool(counted)
+
+    def estimate(self) -> tuple:
+        """(оценка или None, точна ли она)."""
+        if self.known_count is not None:
+            return self.known_count, False
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return None, False
+        if not queryset.query.where:
+            estimate = table_estimate(queryset)
+            if estimate is not None:
+                return estimate, False
+        return self._cached_count()
+
+    @cached_property
+    def count(self):
+        estimate, exact = self.estimate()
+        if exact:
+            return estimate
+        if estimate is None or estimate < settings.PAGINATOR_EXACT_COUNT_BELOW:
+            return super().count
+        self.approximate = True
+        return estimate
+
+
+class CursorPage:
+    """Страница ленты без номера и общего количества записей."""
+    is_cursor = True
+
+    def __init__(self, object_list, cursor, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage {self.cursor or "first"}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по (pub_date, id).
+
+    Вместо COUNT(*) и OFFSET страница выбирается условием
+    по ключу последней показанной записи, поэтому стоимость запроса
+    не зависит от глубины страницы, а новые посты не сдвигают ленту.
+    """
+
+    def __init__(self, queryset, per_page: int):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def get_page(self, token):
+        position = decode_cursor(token) if token else None
+        if position is None:
+            return self._page(self._older(), None, has_previous=False)
+        direction, pub_date, pk = position
+        if direction == NEXT:
+            rows = self._older().filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+            return self._page(rows, token, has_previous=True)
+        rows = self.queryset.filter(
+            Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+        ).order_by('pub_date', 'pk')
+        object_list = list(rows[:self.per_page + 1])
+        if not object_list:
+            return self.get_page(None)
+        has_previous = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page][::-1]
+        return self._build(object_list, token, True, has_previous)
+
+    def _older(self):
+        return self.queryset.order_by('-pub_date', '-pk')
+
+    def _page(self, rows, token, has_previous):
+        object_list = list(rows[:self.per_page + 1])
+        has_next = len(object_list) > self.per_page
+        return self._build(
+            object_list[:self.per_page], token, has_next, has_previous)
+
+    def _build(self, object_list, token, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if object_list and has_next:
+            last = object_list[-1]
+            next_cursor = encode_cursor(NEXT, last.pub_date, last.pk)
+        if object_list and has_previous:
+            first = object_list[0]
+            previous_cursor = encode_cursor(
+                PREVIOUS, first.pub_date, first.pk)
+        return CursorPage(object_list, token, next_cursor, previous_cursor)
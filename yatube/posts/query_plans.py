@@ -0,0 +1,68 @@
+"""Планы запросов лент.
+
+Запросы собираются так же, как во views, и прогоняются через
+QuerySet.explain(). В плане ищутся полные просмотры таблиц и сортировки
+во временных структурах — признаки того, что индекс не используется.
+"""
+from django.db import connection
+from django.db.models import Q
+
+from . import timeline
+from .models import Comment, Follow, Post, TimelineEntry
+
+PAGE_SIZE: int = 10
+
+FULL_SCAN_MARKERS = {
+    'sqlite': ('SCAN ',),
+    'postgresql': ('Seq Scan',),
+}
+INDEX_MARKERS = ('USING INDEX', 'USING COVERING INDEX',
+                 'USING INTEGER PRIMARY KEY')
+SORT_MARKERS = {
+    'sqlite': ('USE TEMP B-TREE',),
+    'postgresql': ('Sort Key',),
+}
+
+
+def feed_queries(user_id: int = 0, author_id: int = 0, group_id: int = 0,
+                 post_id: int = 0) -> dict:
+    """Первые страницы всех лент для заданных пользователя, автора,
+    группы и поста."""
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    limit = PAGE_SIZE + 1
+    return {
+        'index': Post.objects.for_feed()[:PAGE_SIZE],
+        'index_cursor': Post.objects.for_feed().order_by(
+            '-pub_date', '-pk')[:limit],
+        'group_posts': Post.objects.for_feed().filter(
+            group_id=group_id)[:PAGE_SIZE],
+        'profile': Post.objects.for_feed().filter(
+            author_id=author_id)[:PAGE_SIZE],
+        'profile_following': Follow.objects.filter(
+            user_id=user_id, author_id=author_id),
+        'post_comments': Comment.objects.filter(
+            post_id=post_id).select_related('author'),
+        'follow_index': timeline.for_feed(entries)[:PAGE_SIZE],
+        'follow_index_celebrities': Post.objects.for_feed().filter(
+            Q(pk__in=entries.values('post')) | Q(author_id=author_id),
+        )[:PAGE_SIZE],
+        'followers': Follow.objects.filter(
+            author_id=author_id).values('user'),
+    }
+
+
+def _matching(plan: str, markers) -> list:
+    return [line.strip() for line in plan.splitlines()
+            if any(marker in line for marker in markers)]
+
+
+def full_scans(plan: str) -> list:
+    """Строки плана с полным просмотром таблицы."""
+    markers = FULL_SCAN_MARKERS.get(connection.vendor, ())
+    return [line for line in _matching(plan, markers)
+            if not any(marker in line for marker in INDEX_MARKERS)]
+
+
+def sorts(plan: str) -> list:
+    """Строки плана с сортировкой, не покрытой индексом."""
+    return _matching(plan, SORT_MARKERS.get(connection.vendor, ()))
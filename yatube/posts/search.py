@@ -0,0 +1,176 @@
+"""Полнотекстовый поиск по постам.
+
+На SQLite посты индексируются в виртуальной таблице FTS5: в неё пишутся
+основы слов (см. stemmer), ранжирование — bm25. На PostgreSQL поиск идёт
+по to_tsvector('russian', text) с GIN-индексом из миграции. На остальных
+базах остаётся поиск подстрокой.
+
+Результаты листаются keyset-пагинацией по паре (релевантность, id).
+"""
+import base64
+import binascii
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .pagination import CursorPage
+from .stemmer import stems
+
+FTS_TABLE: str = 'posts_post_fts'
+POSTGRES_CONFIG: str = 'russian'
+
+
+def fts_available() -> bool:
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def index_text(text: str) -> str:
+    return ' '.join(stems(text))
+
+
+def match_expression(query: str) -> str:
+    """Запрос FTS5: все основы слов запроса, каждая в кавычках."""
+    return ' AND '.join(f'"{word}"' for word in stems(query))
+
+
+def _insert(cursor, rows) -> None:
+    cursor.executemany(
+        f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+        [(pk, index_text(text)) for pk, text in rows])
+
+
+def index_post(post) -> None:
+    """Добавляет или обновляет пост в индексе FTS5."""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       [post.pk])
+        _insert(cursor, [(post.pk, post.text)])
+
+
+def remove_post(post_id: int) -> None:
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       [post_id])
+
+
+def rebuild(batch_size: int = 1000) -> int:
+    """Перестраивает индекс FTS5 по всей таблице постов."""
+    if not fts_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        batch = []
+        indexed = 0
+        rows = Post.objects.order_by().values_list('pk', 'text')
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                _insert(cursor, batch)
+                indexed += len(batch)
+                batch = []
+        _insert(cursor, batch)
+    return indexed + len(batch)
+
+
+def matching_ids(query: str) -> RawSQL:
+    """Подзапрос id постов, найденных в индексе FTS5, для pk__in."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [match_expression(query) or '""'])
+
+
+def encode_cursor(score: float, pk: int) -> str:
+    raw = f'{score!r}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        score, pk = raw.split('|')
+        return float(score), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def _sqlite_ranked(query: str, after, limit: int) -> list:
+    expression = match_expression(query)
+    if not expression:
+        return []
+    sql = (
+        f'SELECT rowid, -bm25({FTS_TABLE}) AS score FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s'
+    )
+    params = [expression]
+    if after is not None:
+        sql = (f'SELECT rowid, score FROM ({sql}) '
+               'WHERE score < %s OR (score = %s AND rowid > %s)')
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY score DESC, rowid LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _postgres_ranked(query: str, after, limit: int) -> list:
+    from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                SearchVector)
+
+    vector = SearchVector('text', config=POSTGRES_CONFIG)
+    search_query = SearchQuery(query, config=POSTGRES_CONFIG)
+    rows = Post.objects.annotate(
+        score=SearchRank(vector, search_query),
+    ).annotate(document=vector).filter(document=search_query)
+    if after is not None:
+        rows = rows.filter(
+            Q(score__lt=after[0]) | Q(score=after[0], pk__gt=after[1]))
+    return list(rows.order_by('-score', 'pk').values_list(
+        'pk', 'score')[:limit])
+
+
+def _substring_ranked(query: str, after, limit: int) -> list:
+    rows = Post.objects.all()
+    for word in query.split():
+        rows = rows.filter(text__icontains=word)
+    if after is not None:
+        rows = rows.filter(pk__lt=after[1])
+    return [(pk, 0.0) for pk in
+            rows.order_by('-pk').values_list('pk', flat=True)[:limit]]
+
+
+def ranked_ids(query: str, after=None, limit: int = 10) -> list:
+    """Пары (id поста, релевантность) по убыванию релевантности."""
+    if fts_available():
+        return _sqlite_ranked(query, after, limit)
+    if connection.vendor == 'postgresql':
+        return _postgres_ranked(query, after, limit)
+    return _substring_ranked(query, after, limit)
+
+
+def search_page(query: str, token, per_page: int) -> CursorPage:
+    """Страница результатов поиска после позиции из токена ?cursor=."""
+    after = decode_cursor(token) if token else None
+    rows = ranked_ids(query, after, per_page + 1)
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = Post.objects.for_feed().in_bulk([pk for pk, _ in rows])
+    object_list = [posts[pk] for pk, _ in rows if pk in posts]
+    next_cursor = None
+    if has_next:
+        last_pk, last_score = rows[-1]
+        next_cursor = encode_cursor(last_score, last_pk)
+    return CursorPage(object_list, token, next_cursor, None)
@@ -0,0 +1,142 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core import metrics
+
+from . import counters, feed_cache, page_cache, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+# Поля пользователя, которые выводит карточка поста.
+CARD_USER_FIELDS = ('username', 'first_name', 'last_name')
+# Удаляемые сейчас посты: их комментарии уходят каскадом вместе с ними,
+# и пересчитывать карточку и страницы на каждый комментарий незачем.
+_deleting_posts = set()
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, update_fields=None, **kwargs):
+    """Запоминает группу до правки: пост мог перейти в другую."""
+    instance.previous_group_id = instance.group_id
+    if instance.pk is None or (update_fields is not None
+                               and 'group' not in update_fields):
+        return
+    instance.previous_group_id = Post.objects.filter(
+        pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    """Новый пост попадает в счётчики и в ленты подписчиков."""
+    metrics.inc('yatube_writes_total', model='post',
+                action='create' if created else 'update')
+    if created:
+        counters.post_created(instance)
+        timeline.fan_out(instance)
+        feed_cache.post_changed(instance)
+    else:
+        # Правка в админке или в shell тоже переносит пост между группами.
+        counters.post_moved(instance.previous_group_id, instance.group_id)
+        feed_cache.bump_card(instance)
+        feed_cache.post_changed(instance)
+        if instance.previous_group_id not in (None, instance.group_id):
+            feed_cache.bump(
+                feed_cache.group_scope(instance.previous_group_id))
+    search.index_post(instance)
+    page_cache.purge(*page_cache.post_paths(
+        instance, instance.previous_group_id))
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    _deleting_posts.add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    _deleting_posts.discard(instance.pk)
+    metrics.inc('yatube_writes_total', model='post', action='delete')
+    counters.post_created(instance, -1)
+    search.remove_post(instance.pk)
+    feed_cache.post_changed(instance)
+    page_cache.purge(*page_cache.post_paths(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    metrics.inc('yatube_writes_total', model='comment',
+                action='create' if created else 'update')
+    if created:
+        counters.bump_post(instance.post_id, 1)
+    feed_cache.card_changed(instance.post)
+    # Число комментариев выводится и в карточках лент.
+    page_cache.purge(*page_cache.post_paths(instance.post))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    metrics.inc('yatube_writes_total', model='comment', action='delete')
+    if instance.post_id in _deleting_posts:
+        return
+    counters.bump_post(instance.post_id, -1)
+    feed_cache.card_changed(instance.post)
+    # Число комментариев выводится и в карточках лент.
+    page_cache.purge(*page_cache.post_paths(instance.post))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    feed_cache.bump(feed_cache.group_scope(instance.pk),
+                    feed_cache.groups_scope())
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    """Посты удалённой группы обнуляются одним UPDATE без сигналов:
+    устаревают все страницы и ленты, где выводилась группа."""
+    feed_cache.bump(feed_cache.group_scope(instance.pk),
+                    feed_cache.groups_scope())
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    """После подписки в ленту добавляются старые посты автора."""
+    metrics.inc('yatube_writes_total', model='follow',
+                action='create' if created else 'update')
+    if created:
+        counters.follow_created(instance)
+        timeline.backfill(instance.user_id, instance.author_id)
+    feed_cache.bump(feed_cache.follow_scope(instance.user_id))
+    page_cache.purge(*page_cache.follow_paths(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """После отписки посты автора убираются из ленты."""
+    metrics.inc('yatube_writes_total', model='follow', action='delete')
+    counters.follow_created(instance, -1)
+    timeline.remove(instance.user_id, instance.author_id)
+    timeline.follower_lost(instance.author_id)
+    feed_cache.bump(feed_cache.follow_scope(instance.user_id))
+    page_cache.purge(*page_cache.follow_paths(instance))
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    """Запоминает, изменилось ли имя, выводимое в карточках."""
+    instance.card_name_changed = False
+    if instance.pk is None or (
+            update_fields is not None
+            and not set(update_fields) & set(CARD_USER_FIELDS)):
+        # Вход обновляет только last_login: лишний запрос не нужен.
+        return
+    old = User.objects.filter(pk=instance.pk).values_list(
+        *CARD_USER_FIELDS).first()
+    instance.card_name_changed = old is not None and old != tuple(
+        getattr(instance, field) for field in CARD_USER_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if getattr(instance, 'card_name_changed', False):
+        feed_cache.author_renamed(instance.pk)
@@ -0,0 +1,123 @@
+"""Стеммер Snowball для русского языка.
+
+Используется полнотекстовым индексом SQLite, у которого нет русской
+морфологии: в индекс и в запрос попадают основы слов, поэтому
+«котами» находит пост про «кота».
+"""
+import re
+
+VOWELS: str = 'аеиоуыэюя'
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                     ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+REFLEXIVE = ((), ('ся', 'сь'))
+ADJECTIVE = ((), ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый',
+                  'ой', 'ем', 'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому',
+                  'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'))
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+         'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+        ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+         'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+         'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'))
+NOUN = ((), ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи',
+             'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием',
+             'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию',
+             'ью', 'ю', 'ия', 'ья', 'я'))
+SUPERLATIVE = ((), ('ейше', 'ейш'))
+DERIVATIONAL = ((), ('ость', 'ост'))
+
+
+def _regions(word: str):
+    """Границы областей RV, R1 и R2 алгоритма Snowball."""
+    rv = r1 = r2 = len(word)
+    for index, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r1, r2
+
+
+def _strip(word: str, region: int, endings):
+    """Отрезает самое длинное окончание, целиком лежащее в области.
+
+    Окончания первой группы отрезаются только после «а» или «я».
+    Возвращает None, если ни одно окончание не подошло.
+    """
+    after_a, plain = endings
+    candidates = [(ending, True) for ending in after_a]
+    candidates += [(ending, False) for ending in plain]
+    candidates.sort(key=lambda item: len(item[0]), reverse=True)
+    for ending, needs_a in candidates:
+        start = len(word) - len(ending)
+        if not word.endswith(ending) or start < region:
+            continue
+        if needs_a and (start - 1 < region or word[start - 1] not in 'ая'):
+            continue
+        return word[:start]
+    return None
+
+
+def _strip_adjectival(word: str, region: int):
+    stripped = _strip(word, region, ADJECTIVE)
+    if stripped is None:
+        return None
+    without_participle = _strip(stripped, region, PARTICIPLE)
+    return stripped if without_participle is None else without_participle
+
+
+def _step1(word: str, rv: int) -> str:
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        return stripped
+    word = _strip(word, rv, REFLEXIVE) or word
+    for strip in (_strip_adjectival,
+                  lambda word, rv: _strip(word, rv, VERB),
+                  lambda word, rv: _strip(word, rv, NOUN)):
+        stripped = strip(word, rv)
+        if stripped is not None:
+            return stripped
+    return word
+
+
+def _undouble_n(word: str, rv: int) -> str:
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    return word
+
+
+def _step4(word: str, rv: int) -> str:
+    stripped = _strip(word, rv, SUPERLATIVE)
+    if stripped is not None:
+        return _undouble_n(stripped, rv)
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        return word[:-1]
+    return _undouble_n(word, rv)
+
+
+def stem(word: str) -> str:
+    """Основа русского слова; слова не на кириллице не меняются."""
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_RE.search(word):
+        return word
+    rv, _, r2 = _regions(word)
+    word = _step1(word, rv)
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    word = _strip(word, r2, DERIVATIONAL) or word
+    return _step4(word, rv)
+
+
+def stems(text: str) -> list:
+    """Основы всех слов текста в порядке их следования."""
+    return [stem(word) for word in WORD_RE.findall(text)]
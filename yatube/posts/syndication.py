@@ -0,0 +1,245 @@
+"""Ленты Atom, RSS и JSON Feed для главной, групп и профилей.
+
+Посты читаются через values_list().iterator(): ни моделей, ни шаблонов,
+в памяти одновременно не больше SYNDICATION_CHUNK_SIZE строк. Ответ
+отдаётся потоком и по пути складывается в кэш под версией ленты
+(см. posts.feed_cache), так что следующие читатели получают готовые байты
+до следующей записи. Last-Modified — свежий pub_date, ETag — версия
+ленты: агрегаторы, опрашивающие ленту раз в минуту, получают 304.
+"""
+import json
+from datetime import datetime, timezone
+from functools import wraps
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.feedgenerator import rfc2822_date, rfc3339_date
+from django.views.decorators.http import condition, require_GET
+
+from . import feed_cache
+from .models import Group, Post
+
+User = get_user_model()
+
+CACHE_KEY: str = 'syndication:{}:{}:{}:{}'
+TITLE_LENGTH: int = 50
+# Дата обновления пустой ленты.
+EPOCH = datetime.fromtimestamp(0, timezone.utc)
+
+COLUMNS = ('pk', 'text', 'pub_date', 'author__username', 'group__title')
+
+
+class Channel:
+    """Лента: заголовок, посты и области кэша, от версий которых
+    она зависит."""
+
+    def __init__(self, name: str, title: str, link: str, queryset, scopes):
+        self.name = name
+        self.title = title
+        self.link = link
+        self.queryset = queryset
+        self.scopes = scopes
+
+    def version(self) -> str:
+        if not hasattr(self, '_version'):
+            self._version = feed_cache.get_versions(*self.scopes)
+        return self._version
+
+    def newest(self):
+        if not hasattr(self, '_newest'):
+            self._newest = self.queryset.order_by('-pub_date').values_list(
+                'pub_date', flat=True).first()
+        return self._newest
+
+    def items(self, request):
+        """Строки ленты по одной, без материализации queryset."""
+        rows = self.queryset.order_by('-pub_date', '-pk').values_list(
+            *COLUMNS)[:settings.SYNDICATION_ITEMS]
+        for pk, text, pub_date, author, group in rows.iterator(
+                chunk_size=settings.SYNDICATION_CHUNK_SIZE):
+            yield {
+                'id': pk,
+                'url': request.build_absolute_uri(
+                    reverse('posts:post_detail', kwargs={'post_id': pk})),
+                'title': text[:TITLE_LENGTH],
+                'text': text,
+                'pub_date': pub_date,
+                'author': author,
+                'group': group,
+            }
+
+
+def atom(channel: Channel, request, self_url: str):
+    yield ('<?xml version="1.0" encoding="utf-8"?>\n'
+           '<feed xmlns="http://www.w3.org/2005/Atom">'
+           f'<title>{escape(channel.title)}</title>'
+           f'<link href={quoteattr(channel.link)} rel="alternate"/>'
+           f'<link href={quoteattr(self_url)} rel="self"/>'
+           f'<id>{escape(channel.link)}</id>'
+           f'<updated>{rfc3339_date(channel.newest() or EPOCH)}'
+           '</updated>')
+    for item in channel.items(request):
+        category = (f'<category term={quoteattr(item["group"])}/>'
+                    if item['group'] else '')
+        yield (f'<entry><title>{escape(item["title"])}</title>'
+               f'<link href={quoteattr(item["url"])} rel="alternate"/>'
+               f'<id>{escape(item["url"])}</id>'
+               f'<updated>{rfc3339_date(item["pub_date"])}</updated>'
+               f'<published>{rfc3339_date(item["pub_date"])}</published>'
+               f'<author><name>{escape(item["author"])}</name></author>'
+               f'{category}'
+               f'<content type="text">{escape(item["text"])}</content>'
+               '</entry>')
+    yield '</feed>\n'
+
+
+def rss(channel: Channel, request, self_url: str):
+    yield ('<?xml version="1.0" encoding="utf-8"?>\n'
+           '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"'
+           ' xmlns:dc="http://purl.org/dc/elements/1.1/">'
+           f'<channel><title>{escape(channel.title)}</title>'
+           f'<link>{escape(channel.link)}</link>'
+           f'<description>{escape(channel.title)}</description>'
+           f'<atom:link href={quoteattr(self_url)} rel="self"/>'
+           f'<lastBuildDate>{rfc2822_date(channel.newest() or EPOCH)}'
+           '</lastBuildDate>')
+    for item in channel.items(request):
+        category = (f'<category>{escape(item["group"])}</category>'
+                    if item['group'] else '')
+        yield (f'<item><title>{escape(item["title"])}</title>'
+               f'<link>{escape(item["url"])}</link>'
+               f'<guid>{escape(item["url"])}</guid>'
+               f'<pubDate>{rfc2822_date(item["pub_date"])}</pubDate>'
+               f'<dc:creator>{escape(item["author"])}</dc:creator>'
+               f'{category}'
+               f'<description>{escape(item["text"])}</description>'
+               '</item>')
+    yield '</channel></rss>\n'
+
+
+def json_feed(channel: Channel, request, self_url: str):
+    header = json.dumps({
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': channel.title,
+        'home_page_url': channel.link,
+        'feed_url': self_url,
+    }, ensure_ascii=False)
+    # Заголовок без закрывающей скобки: дальше потоком идут items.
+    yield header[:-1] + ', "items": ['
+    separator = ''
+    for item in channel.items(request):
+        entry = {
+            'id': str(item['id']),
+            'url': item['url'],
+            'title': item['title'],
+            'content_text': item['text'],
+            'date_published': rfc3339_date(item['pub_date']),
+            'authors': [{'name': item['author']}],
+        }
+        if item['group']:
+            entry['tags'] = [item['group']]
+        yield separator + json.dumps(entry, ensure_ascii=False)
+        separator = ', '
+    yield ']}\n'
+
+
+# Формат: (генератор, Content-Type).
+FORMATS = {
+    'atom': (atom, 'application/atom+xml; charset=utf-8'),
+    'rss': (rss, 'application/rss+xml; charset=utf-8'),
+    'json': (json_feed, 'application/feed+json; charset=utf-8'),
+}
+
+
+def _cache_key(request, channel: Channel, kind: str) -> str:
+    # В ленте абсолютные ссылки, поэтому хост входит в ключ.
+    return CACHE_KEY.format(request.get_host(), kind, channel.name,
+                            channel.version())
+
+
+def _caching(chunks, key: str):
+    """Отдаёт куски дальше и кладёт ленту в кэш, если она дочитана."""
+    parts = []
+    size = 0
+    for chunk in chunks:
+        data = chunk.encode()
+        size += len(data)
+        if parts is not None:
+            parts.append(data)
+            if size > settings.SYNDICATION_CACHE_MAX_BYTES:
+                parts = None
+        yield data
+    if parts is not None:
+        cache.set(key, b''.join(parts), settings.FEED_CACHE_TIMEOUT)
+
+
+def _etag(request, kind, **kwargs):
+    return f'{kind}-{request.syndication.version()}'
+
+
+def _last_modified(request, kind, **kwargs):
+    return request.syndication.newest()
+
+
+@condition(etag_func=_etag, last_modified_func=_last_modified)
+def _respond(request, kind, **kwargs):
+    channel = request.syndication
+    write, content_type = FORMATS[kind]
+    key = _cache_key(request, channel, kind)
+    cached = cache.get(key)
+    if cached is not None:
+        return HttpResponse(cached, content_type=content_type)
+    chunks = write(channel, request, request.build_absolute_uri())
+    return StreamingHttpResponse(_caching(chunks, key),
+                                 content_type=content_type)
+
+
+def syndication_view(build):
+    """Превращает build(request, **kwargs) -> Channel в представление."""
+    @require_GET
+    @wraps(build)
+    def view(request, kind, **kwargs):
+        if kind not in FORMATS:
+            raise Http404(f'Неизвестный формат ленты: {kind}')
+        request.syndication = build(request, **kwargs)
+        response = _respond(request, kind, **kwargs)
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+    return view
+
+
+@syndication_view
+def index(request):
+    return Channel(
+        'index', 'Последние обновления на сайте',
+        request.build_absolute_uri(reverse('posts:index')),
+        Post.objects.all(),
+        [feed_cache.index_scope(), feed_cache.groups_scope()])
+
+
+@syndication_view
+def group(request, slug: str):
+    group = get_object_or_404(Group, slug=slug)
+    return Channel(
+        f'group:{group.pk}', f'Записи сообщества {group.title}',
+        request.build_absolute_uri(
+            reverse('posts:group_list', kwargs={'slug': slug})),
+        group.posts.all(),
+        [feed_cache.group_scope(group.pk), feed_cache.groups_scope()])
+
+
+@syndication_view
+def profile(request, username: str):
+    author = get_object_or_404(User, username=username)
+    return Channel(
+        f'author:{author.pk}', f'Записи пользователя {author.username}',
+        request.build_absolute_uri(
+            reverse('posts:profile', kwargs={'username': username})),
+        author.posts.all(),
+        [feed_cache.author_scope(author.pk), feed_cache.groups_scope()])
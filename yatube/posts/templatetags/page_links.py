@@ -0,0 +1,12 @@
+from django import template
+
+from posts.pagination import page_window
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_links(page):
+    """Окно номеров страниц; select_paginator считает его заранее."""
+    window = getattr(page, 'window', None)
+    return window if window is not None else page_window(page)
@@ -0,0 +1,44 @@
+"""Кэш карточек постов внутри кэша страниц лент.
+
+Страница ленты кэшируется целиком (singleflight_cache), а при её
+пересчёте карточки не рендерятся заново: все карточки страницы
+читаются из кэша одним get_many, рендерятся только недостающие
+и кладутся одним set_many. Ключ карточки — версия поста
+(Post.version растёт при правке, комментарии и готовой миниатюре)
+и то, что карточка выводит из автора и группы.
+"""
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+CARD_TEMPLATE: str = 'posts/includes/post_card.html'
+
+
+def card_key(post) -> str:
+    author = post.author
+    group_slug = post.group.slug if post.group_id else None
+    return make_template_fragment_key('post_card', [
+        post.pk, post.version, author.username, author.get_full_name(),
+        group_slug,
+    ])
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Готовый HTML карточек постов страницы, по порядку."""
+    posts = list(posts)
+    keys = [card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {}
+    card_template = get_template(CARD_TEMPLATE)
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            missing[key] = cards[key] = card_template.render({'post': post})
+    if missing:
+        cache.set_many(missing, settings.FEED_CACHE_TIMEOUT)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,23 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(image, geometry):
+    """Готовая миниатюра или None, если она ещё в очереди."""
+    return thumbnails.lookup(image, geometry)
+
+
+@register.simple_tag
+def thumbnail_srcset(image):
+    """Атрибут srcset из уже готовых размеров миниатюры."""
+    candidates = []
+    for geometry in settings.POST_THUMBNAIL_SIZES:
+        thumbnail = thumbnails.lookup(image, geometry)
+        if thumbnail is not None:
+            candidates.append(f'{thumbnail.url} {thumbnail.width}w')
+    return ', '.join(candidates)
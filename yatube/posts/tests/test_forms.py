@@ -1,19 +1,23 @@
 import shutil
 import tempfile
+from concurrent.futures import Future
 from http import HTTPStatus
 
-from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse, reverse_lazy
 
-from ..models import Group, Post
+from .. import thumbnails
+from ..models import Group, Post, ThumbnailJob
 
 User = get_user_model()
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class TaskCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -34,7 +38,7 @@ class TaskCreateFormTests(TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
         """Создаем  пользователей."""
@@ -79,3 +83,73 @@ class TaskCreateFormTests(TestCase):
         self.assertEqual(post_1.text, 'test_post')
         self.assertNotEqual(post_1.text, post_2.text)
         self.assertEqual(post_2.text, 'В лесу родилась елочка')
+
+
+class InlinePool:
+    """Пул, выполняющий задания сразу: тестовая база SQLite в памяти
+    недоступна из других потоков и процессов."""
+
+    def submit(self, function, *args):
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailQueueTests(TestCase):
+    SMALL_GIF = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Хранилище ключей sorl-thumbnail живёт в кэше.
+        cache.clear()
+        self.author = User.objects.create_user(username='Painter')
+        self.client.force_login(self.author)
+
+    def test_thumbnail_generated_off_request(self):
+        """Картинка уходит в очередь, лента до генерации
+        показывает заглушку, а после — миниатюру."""
+        image = SimpleUploadedFile(
+            'small.gif', self.SMALL_GIF, content_type='image/gif')
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'С картинкой', 'image': image})
+        post = Post.objects.get(text='С картинкой')
+        jobs = ThumbnailJob.objects.filter(post=post)
+        self.assertEqual(jobs.count(), 1)
+        profile = reverse('posts:profile',
+                          kwargs={'username': self.author.username})
+        guest = Client()
+        for client in (self.client, guest):
+            self.assertContains(client.get(profile),
+                                'Картинка обрабатывается')
+        thumbnails.process(list(jobs), InlinePool())
+        self.assertFalse(ThumbnailJob.objects.filter(post=post).exists())
+        self.assertIsNotNone(thumbnails.lookup(post.image, '960x339'))
+        # Готовая страница гостя тоже сброшена.
+        for client in (self.client, guest):
+            response = client.get(profile)
+            self.assertNotContains(response, 'Картинка обрабатывается')
+            self.assertContains(response, 'srcset=')
+
+    def test_post_deleted_while_generating(self):
+        """Удалённый за время генерации пост не роняет воркер."""
+        image = SimpleUploadedFile(
+            'deleted.gif', self.SMALL_GIF, content_type='image/gif')
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Удалится', 'image': image})
+        post = Post.objects.get(text='Удалится')
+        jobs = list(ThumbnailJob.objects.filter(post=post))
+        post.delete()
+        timings = thumbnails.process(jobs, InlinePool())
+        self.assertEqual(len(timings), 1)
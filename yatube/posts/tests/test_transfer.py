@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post
+from ..transfer import TABLES, Exporter, Importer
+
+User = get_user_model()
+
+
+class TransferTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='transfer_author')
+        cls.reader = User.objects.create_user(username='transfer_reader')
+        cls.group = Group.objects.create(
+            title='Группа, "с кавычками"', slug='transfer',
+            description='Строка\nещё строка')
+        for number in range(5):
+            post = Post.objects.create(text=f'Пост {number}',
+                                       author=cls.author, group=cls.group)
+            Comment.objects.create(text=f'Комментарий {number}',
+                                   author=cls.reader, post=post)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('pk').values_list(
+                'pk', 'text', 'pub_date', 'author__username', 'group__slug')),
+            list(Comment.objects.order_by('pk').values_list(
+                'pk', 'text', 'created', 'post_id', 'author__username')),
+            list(Follow.objects.values_list(
+                'user__username', 'author__username')),
+            list(Group.objects.values_list('pk', 'title', 'description')),
+        )
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка переносят строки и даты без изменений,
+        пользователи находятся по username."""
+        expected = self.snapshot()
+        for fmt, codec in (('ndjson', 'gzip'), ('csv', 'none')):
+            with self.subTest(fmt=fmt, codec=codec):
+                directory = tempfile.mkdtemp(dir=self.directory)
+                Exporter(directory, fmt=fmt, codec=codec,
+                         batch_size=2).run()
+                Group.objects.all().delete()
+                Post.objects.all().delete()
+                Follow.objects.all().delete()
+                User.objects.filter(username='transfer_reader').delete()
+                Importer(directory, batch_size=2).run()
+                self.assertEqual(self.snapshot(), expected)
+
+    def test_export_resumes(self):
+        """Прерванная выгрузка отбрасывает оборванную пачку
+        и продолжает с последней записанной."""
+        exporter = Exporter(self.directory, codec='gzip', batch_size=2)
+        compress = exporter.compress
+        calls = []
+
+        def interrupted(data):
+            # Группы — одна пачка, посты обрываются на второй пачке.
+            calls.append(data)
+            if len(calls) == 3:
+                raise RuntimeError('обрыв')
+            return compress(data)
+
+        exporter.compress = interrupted
+        with self.assertRaises(RuntimeError):
+            exporter.run()
+        posts = TABLES[1]
+        with open(exporter.path(posts), 'ab') as output:
+            output.write(b'\x1f\x8b oborvano')
+        Exporter(self.directory, codec='gzip', batch_size=2).run()
+        expected = self.snapshot()
+        Post.objects.all().delete()
+        Importer(self.directory).run(rebuild=False)
+        self.assertEqual(self.snapshot(), expected)
@@ -1,6 +1,7 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 from posts.models import Group, Post
@@ -25,6 +26,8 @@ class PostModelTest(TestCase):
         )
 
     def setUp(self):
+        # Готовые страницы гостя не должны переходить между тестами.
+        cache.clear()
         self.guest_client = Client()
         self.author_post = Client()
         self.author_post.force_login(self.user)
@@ -1,12 +1,22 @@
+import json
 from http import HTTPStatus
+from io import StringIO
+from xml.etree import ElementTree
 
 from django import forms
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Follow, Group, Post
+from .. import feed_cache, page_cache, query_plans
+from ..pagination import ApproximatePaginator, page_window
+from ..models import (Comment, Follow, Group, Post, TimelineEntry,
+                      UserStats)
 
 User = get_user_model()
 
@@ -155,6 +165,167 @@ class PaginatorViewsTest(TestCase):
                     len(response.context['page_obj']), self.NUMBER_PAGINATOR_1)
 
 
+class PageWindowTest(TestCase):
+    NUMBER_OF_POSTS: int = 300
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='window')
+        cls.group = Group.objects.create(
+            title='Окно', slug='window', description='')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=author, group=cls.group)
+            for number in range(cls.NUMBER_OF_POSTS))
+
+    def test_window(self):
+        """Навигация выводит окно номеров, а не все страницы."""
+        page = Paginator(range(self.NUMBER_OF_POSTS), 10).get_page(15)
+        self.assertEqual(page_window(page),
+                         [1, None, *range(12, 19), None, 30])
+        self.assertEqual(page_window(page.paginator.get_page(2)),
+                         [1, 2, 3, 4, 5, None, 30])
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            {'page': 15})
+        self.assertContains(response, 'href="?page=30"', count=2)
+        self.assertNotContains(response, 'href="?page=20"')
+        self.assertContains(response, '&hellip;', count=2)
+
+
+class ApproximatePaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='approximate')
+        cls.group = Group.objects.create(
+            title='Оценка', slug='approximate', description='')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=author, group=cls.group)
+            for number in range(25))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counter(self):
+        """Большой счётчик заменяет COUNT(*), маленький — нет."""
+        paginator = ApproximatePaginator(Post.objects.all(), 10, 50000)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.count, 50000)
+        self.assertTrue(paginator.approximate)
+        paginator = ApproximatePaginator(self.group.posts.all(), 10, 3)
+        self.assertEqual(paginator.count, 25)
+        self.assertFalse(paginator.approximate)
+
+    @override_settings(PAGINATOR_EXACT_COUNT_BELOW=1)
+    def test_cached_count(self):
+        """COUNT(*) отфильтрованной ленты берётся из кэша."""
+        with self.assertNumQueries(1):
+            self.assertEqual(ApproximatePaginator(
+                self.group.posts.all(), 10).count, 25)
+        with self.assertNumQueries(0):
+            paginator = ApproximatePaginator(self.group.posts.all(), 10)
+            self.assertEqual(paginator.count, 25)
+        self.assertTrue(paginator.approximate)
+
+    @override_settings(PAGINATOR_EXACT_COUNT_BELOW=1)
+    def test_table_statistics(self):
+        """Лента без фильтров считается по статистике таблицы."""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        paginator = ApproximatePaginator(Post.objects.all(), 10)
+        self.assertEqual(paginator.count, Post.objects.count())
+        self.assertTrue(paginator.approximate)
+
+
+class CommentPaginationTest(TestCase):
+    NUMBER_OF_COMMENTS: int = 25
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(text='Пост', author=author)
+        Comment.objects.bulk_create(
+            Comment(text=f'Комментарий {number}', author=author,
+                    post=cls.post)
+            for number in range(cls.NUMBER_OF_COMMENTS))
+
+    def test_comments_load_in_portions(self):
+        """Пост выводит первую порцию комментариев, остальные
+        подгружаются по курсору без повторов."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        comments = list(response.context['comments'])
+        self.assertEqual(len(comments), 20)
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        # Пост и порция с авторами.
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                url, {'comments': response.context['comments_next']})
+        comments += response.context['comments']
+        self.assertIsNone(response.context['comments_next'])
+        self.assertEqual(
+            [comment.pk for comment in comments],
+            list(self.post.comments.order_by('created', 'pk')
+                 .values_list('pk', flat=True)))
+
+
+class CursorPaginatorViewsTest(TestCase):
+    NUMBER_OF_POSTS: int = 15
+    NUMBER_PAGINATOR: int = 10
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Cursor')
+        cls.group = Group.objects.create(
+            title='test_title',
+            description='test_description',
+            slug='cursor-slug'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'text{number}', author=cls.author, group=cls.group)
+            for number in range(cls.NUMBER_OF_POSTS)
+        )
+
+    def test_cursor_pages(self):
+        """Keyset-пагинация проходит ленту без пропусков и повторов."""
+        pages = {reverse('posts:group_list',
+                         kwargs={'slug': self.group.slug}),
+                 reverse('posts:profile',
+                         kwargs={'username': self.author})}
+        for reverse_name in pages:
+            with self.subTest(reverse_name=reverse_name):
+                first = self.client.get(reverse_name, {'cursor': ''})
+                first_page = first.context['page_obj']
+                self.assertEqual(len(first_page), self.NUMBER_PAGINATOR)
+                self.assertFalse(first_page.has_previous())
+                second = self.client.get(
+                    reverse_name, {'cursor': first_page.next_cursor})
+                second_page = second.context['page_obj']
+                self.assertEqual(
+                    len(second_page),
+                    self.NUMBER_OF_POSTS - self.NUMBER_PAGINATOR)
+                self.assertFalse(second_page.has_next())
+                self.assertEqual(
+                    {post.pk for post in first_page}
+                    | {post.pk for post in second_page},
+                    set(self.author.posts.values_list('pk', flat=True)))
+                back = self.client.get(
+                    reverse_name, {'cursor': second_page.previous_cursor})
+                self.assertEqual(list(back.context['page_obj']),
+                                 list(first_page))
+
+    def test_broken_cursor(self):
+        """Битый токен ?cursor= открывает первую страницу."""
+        response = self.client.get(reverse('posts:index'),
+                                   {'cursor': 'broken'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.context['page_obj']),
+                         self.NUMBER_PAGINATOR)
+
+
 class CacheTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -173,19 +344,218 @@ class CacheTests(TestCase):
     def test_cache_index(self):
         """Тест кэширования страницы index.html"""
         first_state = self.authorized_client.get(reverse('posts:index'))
-        post_1 = Post.objects.get(pk=1)
-        post_1.text = 'Измененный текст'
-        post_1.save()
+        Post.objects.filter(pk=self.post.pk).update(text='Измененный текст')
         second_state = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(first_state.content, second_state.content)
         cache.clear()
         third_state = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(first_state.content, third_state.content)
 
+    def test_cache_invalidated_on_write(self):
+        """Сохранение поста сразу сбрасывает кэш лент с ним."""
+        urls = (reverse('posts:index'),
+                reverse('posts:profile',
+                        kwargs={'username': self.post.author.username}))
+        for url in urls:
+            self.authorized_client.get(url)
+        self.post.text = 'Измененный текст'
+        self.post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Измененный текст')
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='card_author')
+        cls.post = Post.objects.create(text='Карточка', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def card_templates(self):
+        # Страница целиком устаревает, карточки — нет.
+        feed_cache.bump(feed_cache.index_scope())
+        page_cache.purge(reverse('posts:index'))
+        response = self.client.get(reverse('posts:index'))
+        return response, [template.name for template in response.templates
+                          if template.name == 'posts/includes/post_card.html']
+
+    def test_cards_cached_by_version(self):
+        """Пересчёт страницы берёт карточки из кэша, правка поста
+        и комментарий к нему обновляют карточку."""
+        _, rendered = self.card_templates()
+        self.assertTrue(rendered)
+        response, rendered = self.card_templates()
+        self.assertEqual(rendered, [])
+        self.assertContains(response, 'Карточка')
+        self.post.text = 'Исправленная карточка'
+        self.post.save()
+        response, rendered = self.card_templates()
+        self.assertEqual(len(rendered), 1)
+        self.assertContains(response, 'Исправленная карточка')
+        Comment.objects.create(text='Первый', author=self.author,
+                               post=self.post)
+        response, _ = self.card_templates()
+        self.assertContains(response, 'комментариев: 1')
+
+    def test_stale_instance_keeps_version(self):
+        """Правка экземпляра, загруженного до комментария, не возвращает
+        старую версию: карточка не берётся из кэша со старым текстом."""
+        stale = Post.objects.get(pk=self.post.pk)
+        Comment.objects.create(text='Первый', author=self.author,
+                               post=self.post)
+        self.card_templates()
+        stale.text = 'Правка старого экземпляра'
+        stale.save()
+        response, rendered = self.card_templates()
+        self.assertEqual(len(rendered), 1)
+        self.assertContains(response, 'Правка старого экземпляра')
+        self.assertContains(response, 'комментариев: 1')
+
+    def test_card_change_refreshes_feed_fragment(self):
+        """Комментарий и смена имени автора видны в закэшированной
+        ленте без сброса её областей вручную."""
+        reader = Client()
+        reader.force_login(self.author)
+        url = reverse('posts:index')
+        self.assertNotContains(reader.get(url), 'комментариев: 1')
+        Comment.objects.create(text='Первый', author=self.author,
+                               post=self.post)
+        self.assertContains(reader.get(url), 'комментариев: 1')
+        self.author.first_name = 'Переименованный'
+        self.author.save()
+        self.assertContains(reader.get(url), 'Переименованный')
+
+    def test_comment_skips_follower_feeds(self):
+        """Комментарий не сдвигает ленты подписчиков, но их закэшированная
+        страница показывает новую карточку."""
+        follower = User.objects.create_user(username='card_follower')
+        Follow.objects.create(user=follower, author=self.author)
+        reader = Client()
+        reader.force_login(follower)
+        url = reverse('posts:follow_index')
+        self.assertNotContains(reader.get(url), 'комментариев: 1')
+        scope = feed_cache.follow_scope(follower.pk)
+        version = feed_cache.get_versions(scope)
+        Comment.objects.create(text='Первый', author=self.author,
+                               post=self.post)
+        self.assertEqual(feed_cache.get_versions(scope), version)
+        self.assertContains(reader.get(url), 'комментариев: 1')
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='page_author')
+        cls.group = Group.objects.create(
+            title='Группа страниц', slug='page-slug', description='')
+        cls.post = Post.objects.create(
+            text='Первый пост', author=cls.author, group=cls.group)
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': cls.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_guest_served_from_cache(self):
+        """Повторный запрос гостя не доходит до базы и шаблонов."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first[page_cache.HEADER], 'miss')
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second[page_cache.HEADER], 'hit')
+                self.assertEqual(second.content, first.content)
+                self.assertIn('public', second['Cache-Control'])
+                self.assertIn('max-age=30', second['Cache-Control'])
+                self.assertIn('Cookie', second['Vary'])
+
+    def test_not_modified_from_cache(self):
+        """Готовая страница с ETag отвечает 304 без запросов."""
+        url = self.urls[3]
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_logged_in_bypass(self):
+        """Пользователь с сессией получает свою страницу, private."""
+        self.client.force_login(self.author)
+        for _ in range(2):
+            response = self.client.get(self.urls[0])
+            self.assertNotIn(page_cache.HEADER, response)
+            self.assertIn('private', response['Cache-Control'])
+
+    def test_writes_purge_pages(self):
+        """Новый пост, комментарий и правка группы сбрасывают страницы,
+        на которых они видны."""
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.create(text='Второй пост', author=self.author,
+                            group=self.group)
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response[page_cache.HEADER], 'miss')
+                self.assertContains(response, 'Второй пост')
+        # Страница другого поста новый пост не затрагивает.
+        self.assertEqual(
+            self.client.get(self.urls[3])[page_cache.HEADER], 'hit')
+        Comment.objects.create(text='Свежий комментарий',
+                               author=self.author, post=self.post)
+        self.assertContains(self.client.get(self.urls[3]),
+                            'Свежий комментарий')
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertContains(self.client.get(self.urls[1]), 'Новое название')
+
+    def test_moved_post_purges_old_group(self):
+        """Пост, перенесённый в другую группу, пропадает со страницы
+        старой группы у гостя."""
+        other = Group.objects.create(title='Другая', slug='page-other')
+        post = Post.objects.create(text='Переезжающий пост',
+                                   author=self.author, group=self.group)
+        self.assertContains(self.client.get(self.urls[1]),
+                            'Переезжающий пост')
+        post.group = other
+        post.save()
+        response = self.client.get(self.urls[1])
+        self.assertEqual(response[page_cache.HEADER], 'miss')
+        self.assertNotContains(response, 'Переезжающий пост')
+
+    def test_deleted_group_purges_pages(self):
+        """Удаление группы сбрасывает страницы с её постами у гостя."""
+        group = Group.objects.create(title='Удаляемая', slug='page-deleted')
+        post = Post.objects.create(text='Пост без группы',
+                                   author=self.author, group=group)
+        group_link = reverse('posts:group_list', kwargs={'slug': group.slug})
+        for url in self.urls[0], self.urls[2]:
+            self.assertContains(self.client.get(url), group_link)
+        group.delete()
+        post.refresh_from_db()
+        self.assertIsNone(post.group_id)
+        for url in self.urls[0], self.urls[2]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response[page_cache.HEADER], 'miss')
+                self.assertNotContains(response, group_link)
+
 
 class FollowTests(TestCase):
     @classmethod
     def setUp(self):
+        cache.clear()
         self.client_follower = Client()
         self.client_following = Client()
         self.user_follower = User.objects.create_user(username='follower',
@@ -227,3 +597,354 @@ class FollowTests(TestCase):
         self.assertEqual(post_text_0, 'Проверка теста')
         response = self.client_following.get('posts:follow_index')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_follow_unique(self):
+        """Повторная подписка на автора не создаёт вторую запись."""
+        Follow.objects.create(user=self.user_follower,
+                              author=self.user_following)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user_follower,
+                                  author=self.user_following)
+
+    def test_timeline_fan_out(self):
+        """Пост подписки материализуется в ленте и убирается после
+        отписки."""
+        Follow.objects.create(user=self.user_follower,
+                              author=self.user_following)
+        Post.objects.create(author=self.user_following, text='Новый пост')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user_follower).count(), 2)
+        self.client_follower.get(reverse('posts:profile_unfollow',
+                                         kwargs={'username':
+                                                 self.user_following.
+                                                 username}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user_follower).exists())
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=1)
+    def test_follow_lenta_celebrity(self):
+        """Посты знаменитостей подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.user_follower,
+                              author=self.user_following)
+        Post.objects.create(author=self.user_following, text='Новый пост')
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.client_follower.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=2)
+    def test_former_celebrity_posts_stay(self):
+        """Посты, опубликованные в статусе знаменитости, остаются в ленте,
+        когда автор опускается ниже порога."""
+        other = User.objects.create_user(username='other_follower')
+        for user in self.user_follower, other:
+            Follow.objects.create(user=user, author=self.user_following)
+        Post.objects.create(author=self.user_following, text='Звёздный пост')
+        Follow.objects.filter(user=other).delete()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user_follower).count(), 2)
+        response = self.client_follower.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Звёздный пост')
+
+
+class CountersTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='counted')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='test_title',
+            description='test_description',
+            slug='counted-slug'
+        )
+        self.client.force_login(self.reader)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(
+            text='text', author=self.author, group=self.group)
+        self.client.post(reverse('posts:add_comment',
+                                 kwargs={'post_id': post.pk}),
+                         {'text': 'comment'})
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': self.author.username}))
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual((stats.posts_count, stats.followers_count), (1, 1))
+        response = self.client.get(reverse(
+            'posts:profile', kwargs={'username': self.author.username}))
+        self.assertEqual(response.context['posts_count'], 1)
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': self.author.username}))
+        post.delete()
+        self.group.refresh_from_db()
+        stats.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual((stats.posts_count, stats.followers_count), (0, 0))
+
+    def test_group_change_outside_views(self):
+        """Перенос поста между группами вне формы тоже считается,
+        а разошедшийся счётчик не уходит ниже нуля."""
+        other = Group.objects.create(title='other', slug='other-slug')
+        post = Post.objects.create(
+            text='text', author=self.author, group=self.group)
+        post.group = other
+        post.save()
+        self.group.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.group.posts_count, other.posts_count), (0, 1))
+        Comment.objects.create(text='old', author=self.reader, post=post)
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+        Comment.objects.filter(post=post).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_recount(self):
+        """Команда recount исправляет расхождения счётчиков."""
+        post = Post.objects.create(
+            text='text', author=self.author, group=self.group)
+        Post.objects.filter(pk=post.pk).update(comments_count=42)
+        UserStats.objects.filter(user=self.author).delete()
+        call_command('recount', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1)
+
+
+class PostDeleteTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='deleting')
+
+    def delete_queries(self, comments: int) -> int:
+        post = Post.objects.create(text='Удаляемый', author=self.author)
+        Comment.objects.bulk_create(
+            Comment(text=str(number), author=self.author, post=post)
+            for number in range(comments))
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        return len(queries)
+
+    def test_cascade_cost_independent_of_comments(self):
+        """Комментарии, удалённые вместе с постом, не пересчитывают
+        карточку и страницы каждый по отдельности."""
+        self.assertEqual(self.delete_queries(20), self.delete_queries(1))
+        comment_post = Post.objects.create(text='Живой', author=self.author)
+        comment = Comment.objects.create(text='Один', author=self.author,
+                                         post=comment_post)
+        comment.delete()
+        comment_post.refresh_from_db()
+        self.assertEqual(comment_post.comments_count, 0)
+
+
+class QueryBudgetTests(TestCase):
+    """Число запросов страницы не зависит от числа постов на ней."""
+    NUMBER_OF_POSTS: int = 12
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='budget')
+        cls.reader = User.objects.create_user(username='budget_reader')
+        cls.group = Group.objects.create(
+            title='test_title',
+            description='test_description',
+            slug='budget-slug'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(cls.NUMBER_OF_POSTS):
+            post = Post.objects.create(
+                text=f'text{number}', author=cls.author, group=cls.group)
+            Comment.objects.create(
+                text=f'comment{number}', author=cls.reader, post=post)
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def assertQueryBudget(self, client, url, budget):
+        with self.assertNumQueries(budget):
+            response = client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_guest_pages(self):
+        """Ленты и пост для гостя укладываются в бюджет запросов."""
+        # Группа и профиль тратят ещё по запросу на ETag, главная
+        # на холодном кэше — на чтение статистики таблицы для оценки
+        # числа постов.
+        budgets = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list',
+                    kwargs={'slug': self.group.slug}): 4,
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}): 4,
+            reverse('posts:post_detail',
+                    kwargs={'post_id': self.post.pk}): 2,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.client, url, budget)
+
+    def test_follow_page(self):
+        """Лента подписок укладывается в бюджет запросов."""
+        self.assertQueryBudget(
+            self.reader_client, reverse('posts:follow_index'), 5)
+
+    def test_not_modified(self):
+        """Страница с неизменившимся ETag отдаётся как 304 без рендера,
+        новый комментарий меняет ETag поста."""
+        # Сессия, пользователь и запрос ETag.
+        budgets = {
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 3,
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}): 3,
+            reverse('posts:post_detail',
+                    kwargs={'post_id': self.post.pk}): 2,
+        }
+        urls = list(budgets)
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                etag = self.reader_client.get(url)['ETag']
+                with self.assertNumQueries(budget):
+                    response = self.reader_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+                self.assertNotEqual(self.client.get(url)['ETag'], etag)
+        etags = {url: self.reader_client.get(url)['ETag'] for url in urls}
+        Comment.objects.create(text='Новый', author=self.reader,
+                               post=self.post)
+        # Карточки групп и профилей выводят число комментариев.
+        # Last-Modified не отдаётся: по дате публикации If-Modified-Since
+        # не заметил бы ни правки, ни удаления поста.
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_profile_without_stats(self):
+        """Профиль без строки счётчиков получает ETag нулевых счётчиков."""
+        newcomer = User.objects.create_user(username='budget_newcomer')
+        UserStats.objects.filter(user=newcomer).delete()
+        response = self.client.get(reverse(
+            'posts:profile', kwargs={'username': newcomer.username}))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_feed_plans_use_indexes(self):
+        """Запросы лент не просматривают таблицы целиком."""
+        queries = query_plans.feed_queries(
+            user_id=self.reader.pk, author_id=self.author.pk,
+            group_id=self.group.pk, post_id=self.post.pk)
+        for name, queryset in queries.items():
+            with self.subTest(query=name):
+                self.assertEqual(
+                    query_plans.full_scans(queryset.explain()), [])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='searcher')
+        self.post = Post.objects.create(
+            text='Кот спит на подоконнике', author=self.author)
+        Post.objects.create(text='Собака гуляет', author=self.author)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': query, **params})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response.context['page_obj']
+
+    def test_search_stemming(self):
+        """Поиск находит пост по другой форме слова."""
+        self.assertEqual(list(self.search('котами')), [self.post])
+        self.assertEqual(list(self.search('птица')), [])
+
+    def test_search_index_follows_posts(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        self.post.text = 'Птицы поют'
+        self.post.save()
+        self.assertEqual(list(self.search('котами')), [])
+        self.assertEqual(list(self.search('птица')), [self.post])
+        self.post.delete()
+        self.assertEqual(list(self.search('птица')), [])
+
+    def test_search_pages(self):
+        """Результаты листаются по ?cursor= без повторов."""
+        for number in range(12):
+            Post.objects.create(text=f'Кот номер {number}',
+                                author=self.author)
+        first = self.search('кот')
+        self.assertEqual(len(first), 10)
+        second = self.search('кот', cursor=first.next_cursor)
+        self.assertEqual(len(second), 3)
+        self.assertFalse(set(first) & set(second))
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search('кот')), 10)
+
+
+class SyndicationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='feed_author')
+        cls.group = Group.objects.create(
+            title='Группа & друзья', slug='feed-group', description='')
+        for number in range(3):
+            Post.objects.create(text=f'Пост <{number}>', author=cls.author,
+                                group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self, kind):
+        return [
+            reverse('posts:index_feed', kwargs={'kind': kind}),
+            reverse('posts:group_feed',
+                    kwargs={'slug': self.group.slug, 'kind': kind}),
+            reverse('posts:profile_feed',
+                    kwargs={'username': self.author.username, 'kind': kind}),
+        ]
+
+    def test_formats(self):
+        """Все форматы разбираются и содержат посты ленты."""
+        for url in self.urls('atom') + self.urls('rss'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                root = ElementTree.fromstring(
+                    b''.join(response.streaming_content))
+                texts = [element.text for element in root.iter()
+                         if element.tag.endswith(('content', 'description'))]
+                self.assertIn('Пост <0>', texts)
+        for url in self.urls('json'):
+            with self.subTest(url=url):
+                data = json.loads(
+                    b''.join(self.client.get(url).streaming_content))
+                self.assertEqual([item['content_text']
+                                  for item in data['items']][:3],
+                                 ['Пост <2>', 'Пост <1>', 'Пост <0>'])
+        response = self.client.get(
+            reverse('posts:index_feed', kwargs={'kind': 'html'}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_cached_until_write(self):
+        """Повторная лента берётся из кэша, запись поста её обновляет."""
+        url = self.urls('rss')[2]
+        first = b''.join(self.client.get(url).streaming_content)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.content, first)
+        last_modified = response['Last-Modified']
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(text='Свежий', author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('Свежий'.encode(),
+                      b''.join(response.streaming_content))
@@ -0,0 +1,124 @@
+"""Генерация миниатюр картинок постов вне запроса.
+
+Посты с новой картинкой попадают в очередь ThumbnailJob, а команда
+thumbnail_worker обрабатывает её пулом процессов. Шаблоны только ищут
+готовую миниатюру в хранилище sorl-thumbnail и, пока её нет, выводят
+заглушку, поэтому рендер ленты никогда не ресайзит картинки сам.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connections
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core import metrics
+
+from . import feed_cache, page_cache
+from .models import Post, ThumbnailJob
+
+
+class LookupBackend(ThumbnailBackend):
+    def lookup(self, file_, geometry_string, **options):
+        """Готовая миниатюра из хранилища sorl или None.
+
+        Имя файла строится так же, как в get_thumbnail(),
+        но сама миниатюра никогда не создаётся.
+        """
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = LookupBackend()
+
+
+def lookup(image, geometry: str):
+    if not image:
+        return None
+    return backend.lookup(image, geometry, **settings.POST_THUMBNAIL_OPTIONS)
+
+
+def generate(image_name: str) -> float:
+    """Создаёт все размеры миниатюры, возвращает затраченное время."""
+    started = time.monotonic()
+    for geometry in settings.POST_THUMBNAIL_SIZES:
+        get_thumbnail(image_name, geometry, **settings.POST_THUMBNAIL_OPTIONS)
+    return time.monotonic() - started
+
+
+def enqueue(post) -> None:
+    """Ставит картинку поста в очередь (или создаёт миниатюры сразу,
+    если POST_THUMBNAILS_ASYNC выключен)."""
+    if not post.image:
+        return
+    if not settings.POST_THUMBNAILS_ASYNC:
+        generate(post.image.name)
+        return
+    ThumbnailJob.objects.get_or_create(post=post, image=post.image.name)
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+    # Соединение родителя не должно использоваться в дочернем процессе.
+    connections.close_all()
+
+
+def process(jobs, pool) -> list:
+    """Обрабатывает пачку заданий, возвращает время генерации по каждому."""
+    futures = {pool.submit(generate, job.image): job for job in jobs}
+    timings = []
+    for future in as_completed(futures):
+        job = futures[future]
+        try:
+            timings.append(future.result())
+        except Exception as error:
+            metrics.inc('yatube_thumbnail_failures_total')
+            job.attempts += 1
+            job.error = repr(error)
+            job.save(update_fields=['attempts', 'error'])
+        else:
+            metrics.observe('yatube_thumbnail_seconds', timings[-1])
+            post = Post.objects.select_related('author', 'group').filter(
+                pk=job.post_id).first()
+            job.delete()
+            if post is None:
+                # Пост удалили, пока генерировалась миниатюра.
+                continue
+            # Закэшированные ленты и карточка ещё показывают заглушку.
+            feed_cache.card_changed(post)
+            page_cache.purge(*page_cache.post_paths(post))
+    return timings
+
+
+def run_worker(processes: int, batch_size: int, once: bool = False,
+               poll_interval: float = 1.0, report=None) -> None:
+    """Выбирает задания из очереди и раздаёт их пулу процессов."""
+    connections.close_all()
+    with ProcessPoolExecutor(processes, initializer=_init_worker) as pool:
+        while True:
+            jobs = list(ThumbnailJob.objects.filter(
+                attempts__lt=settings.POST_THUMBNAIL_MAX_ATTEMPTS,
+            )[:batch_size])
+            if not jobs:
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+            timings = process(jobs, pool)
+            if report is not None:
+                report(len(jobs), timings)
@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.db import connection
+
+from .models import FEED_FIELDS, Follow, Post, TimelineEntry, UserStats
+
+
+def is_celebrity(author_id: int) -> bool:
+    """Автор с огромным числом подписчиков не раскладывается по лентам."""
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+    ).exists()
+
+
+def followed_celebrities(user) -> list:
+    """Авторы из подписок пользователя, чьи посты читаются из Post."""
+    authors = Follow.objects.filter(user=user).values('author')
+    return list(
+        UserStats.objects.filter(
+            user__in=authors,
+            followers_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+        ).values_list('user_id', flat=True)
+    )
+
+
+def batch_size() -> int:
+    """TIMELINE_BATCH_SIZE, но не больше, чем база примет в одном INSERT:
+    SQLite ограничивает число параметров и частей составного SELECT."""
+    fields = [field for field in TimelineEntry._meta.concrete_fields
+              if not field.primary_key]
+    return min(settings.TIMELINE_BATCH_SIZE,
+               connection.ops.bulk_batch_size(fields, []))
+
+
+def fan_out(post: Post) -> None:
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post.pk,
+                       author_id=post.author_id, pub_date=post.pub_date)
+         for user_id in followers.iterator()),
+        batch_size=batch_size(),
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id: int, author_id: int) -> None:
+    """Добавляет в ленту читателя уже опубликованные посты автора."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk,
+                       author_id=author_id, pub_date=pub_date)
+         for pk, pub_date in posts.iterator()),
+        batch_size=batch_size(),
+        ignore_conflicts=True,
+    )
+
+
+def follower_lost(author_id: int) -> None:
+    """Автор, опустившийся ниже порога знаменитости, снова раскладывается
+    по лентам.
+
+    Посты, опубликованные им в статусе знаменитости, в ленты не попали
+    и читались подмешиванием, которое для него теперь выключено: они
+    добавляются в ленты всех его подписчиков. При подъёме выше порога
+    ничего делать не нужно — подмешивание читает все посты автора.
+    """
+    followers_count = UserStats.objects.filter(
+        user_id=author_id).values_list('followers_count', flat=True).first()
+    if followers_count != settings.TIMELINE_CELEBRITY_FOLLOWERS - 1:
+        return
+    followers = list(Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True))
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk,
+                       author_id=author_id, pub_date=pub_date)
+         for pk, pub_date in posts.iterator() for user_id in followers),
+        batch_size=batch_size(),
+        ignore_conflicts=True,
+    )
+
+
+def remove(user_id: int, author_id: int) -> None:
+    """Убирает посты автора из ленты отписавшегося читателя."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+
+
+def for_feed(entries):
+    """Записи ленты вместе с постами в объёме, нужном шаблону ленты."""
+    fields = (f'post__{field}' for field in FEED_FIELDS)
+    return entries.select_related(
+        'post__author', 'post__group',
+    ).only('pub_date', 'user', 'post', *fields)
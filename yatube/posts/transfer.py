@@ -0,0 +1,324 @@
+"""Выгрузка и загрузка групп, постов, комментариев и подписок.
+
+Каждая таблица выгружается в свой файл NDJSON или CSV, по желанию
+сжатый gzip или zstd (нужен пакет zstandard). Строки читаются
+keyset-проходом по pk через iterator(): на PostgreSQL это курсор
+на стороне сервера, в памяти держится одна пачка. Каждая пачка пишется
+отдельным кадром сжатия, после записи её граница и последний pk
+сохраняются в checkpoint.json: прерванная выгрузка обрезает файл
+до последней целой пачки и продолжает с места остановки.
+
+Загрузка пишет пачки через bulk_create(ignore_conflicts=True) в своих
+транзакциях и отмечает прочитанные строки в import-checkpoint.json,
+поэтому повторный запуск продолжает работу, а повтор пачки ничего
+не дублирует. Первичные ключи групп, постов и комментариев
+сохраняются, пользователи сопоставляются по username; недостающие
+создаются без пароля. Сигналы при bulk_create не срабатывают,
+поэтому в конце счётчики, поиск и ленты подписок перестраиваются.
+"""
+import csv
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from io import StringIO, TextIOWrapper
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import denormalized
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FORMATS = ('ndjson', 'csv')
+# Сжатие: расширение файла.
+CODECS = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+EXPORT_CHECKPOINT: str = 'checkpoint.json'
+IMPORT_CHECKPOINT: str = 'import-checkpoint.json'
+
+
+@contextmanager
+def explicit_dates():
+    """Сохраняет даты из файла: auto_now_add перезаписал бы их
+    текущим временем при bulk_create."""
+    fields = [Post._meta.get_field('pub_date'),
+              Comment._meta.get_field('created')]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _user_ids(usernames) -> dict:
+    """username -> pk; недостающие пользователи создаются."""
+    usernames = set(usernames)
+    found = dict(User.objects.filter(username__in=usernames)
+                 .values_list('username', 'pk'))
+    missing = usernames - found.keys()
+    if missing:
+        password = make_password(None)
+        User.objects.bulk_create(
+            [User(username=username, password=password)
+             for username in missing], ignore_conflicts=True)
+        found.update(User.objects.filter(username__in=missing)
+                     .values_list('username', 'pk'))
+    return found
+
+
+def _int(value):
+    return int(value) if value not in (None, '') else None
+
+
+def _groups(rows):
+    return [Group(pk=_int(row['id']), title=row['title'], slug=row['slug'],
+                  description=row['description']) for row in rows]
+
+
+def _posts(rows):
+    users = _user_ids(row['author'] for row in rows)
+    return [Post(pk=_int(row['id']), text=row['text'],
+                 pub_date=parse_datetime(row['pub_date']),
+                 author_id=users[row['author']],
+                 group_id=_int(row['group']), image=row['image'] or '')
+            for row in rows]
+
+
+def _comments(rows):
+    users = _user_ids(row['author'] for row in rows)
+    return [Comment(pk=_int(row['id']), text=row['text'],
+                    created=parse_datetime(row['created']),
+                    post_id=_int(row['post']),
+                    author_id=users[row['author']])
+            for row in rows]
+
+
+def _follows(rows):
+    # id подписки не переносится: пара (user, author) уникальна сама.
+    users = _user_ids(name for row in rows
+                      for name in (row['user'], row['author']))
+    return [Follow(user_id=users[row['user']],
+                   author_id=users[row['author']]) for row in rows]
+
+
+@dataclass
+class Table:
+    name: str
+    model: type
+    # Колонка файла: путь values_list() от строки таблицы.
+    columns: dict
+    build: object
+
+
+TABLES = (
+    Table('groups', Group, {'id': 'pk', 'title': 'title', 'slug': 'slug',
+                            'description': 'description'}, _groups),
+    Table('posts', Post, {'id': 'pk', 'text': 'text',
+                          'pub_date': 'pub_date',
+                          'author': 'author__username',
+                          'group': 'group_id', 'image': 'image'}, _posts),
+    Table('comments', Comment, {'id': 'pk', 'text': 'text',
+                                'created': 'created', 'post': 'post_id',
+                                'author': 'author__username'}, _comments),
+    Table('follows', Follow, {'id': 'pk', 'user': 'user__username',
+                              'author': 'author__username'}, _follows),
+)
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError('Для сжатия zstd нужен пакет zstandard')
+    return zstandard
+
+
+def _compressor(codec: str):
+    if codec == 'gzip':
+        return gzip.compress
+    if codec == 'zstd':
+        return _zstandard().ZstdCompressor().compress
+    return bytes
+
+
+@contextmanager
+def _reader(path: str):
+    """Текстовый поток файла выгрузки; кадры сжатия читаются подряд."""
+    if path.endswith(CODECS['gzip']):
+        stream = gzip.open(path, 'rt', encoding='utf-8', newline='')
+    elif path.endswith(CODECS['zstd']):
+        reader = _zstandard().ZstdDecompressor().stream_reader(
+            open(path, 'rb'), read_across_frames=True)
+        stream = TextIOWrapper(reader, encoding='utf-8', newline='')
+    else:
+        stream = open(path, encoding='utf-8', newline='')
+    with stream:
+        yield stream
+
+
+def _encode(names: list, batch: list, fmt: str, header: bool) -> bytes:
+    if fmt == 'ndjson':
+        return ''.join(
+            json.dumps(dict(zip(names, values)), ensure_ascii=False,
+                       default=str) + '\n' for values in batch).encode()
+    output = StringIO()
+    writer = csv.writer(output)
+    if header:
+        writer.writerow(names)
+    writer.writerows(batch)
+    return output.getvalue().encode()
+
+
+def _decode(stream, fmt: str):
+    if fmt == 'ndjson':
+        return (json.loads(line) for line in stream if line.strip())
+    return csv.DictReader(stream)
+
+
+def _batches(rows, size: int):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Checkpoint:
+    """Состояние таблиц в JSON-файле; запись атомарная."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = {}
+        if os.path.exists(path):
+            with open(path) as source:
+                self.state = json.load(source)
+
+    def table(self, name: str) -> dict:
+        return self.state.setdefault('tables', {}).setdefault(name, {})
+
+    def save(self) -> None:
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as output:
+            json.dump(self.state, output)
+        os.replace(temporary, self.path)
+
+
+class Exporter:
+    def __init__(self, directory: str, fmt: str = 'ndjson',
+                 codec: str = 'none', batch_size: int = 5000, report=None):
+        if fmt not in FORMATS or codec not in CODECS:
+            raise ValueError(f'Неизвестный формат: {fmt}, {codec}')
+        self.directory = directory
+        self.fmt = fmt
+        self.codec = codec
+        self.batch_size = batch_size
+        self.report = report or (lambda message: None)
+        self.compress = _compressor(codec)
+
+    def path(self, table: Table) -> str:
+        return os.path.join(self.directory,
+                            f'{table.name}.{self.fmt}{CODECS[self.codec]}')
+
+    def run(self, tables=TABLES) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        checkpoint = Checkpoint(
+            os.path.join(self.directory, EXPORT_CHECKPOINT))
+        started = checkpoint.state.setdefault(
+            'options', {'format': self.fmt, 'codec': self.codec})
+        if started != {'format': self.fmt, 'codec': self.codec}:
+            raise ValueError(
+                f'Выгрузка в {self.directory} начата с параметрами '
+                f'{started}: продолжить её можно только с ними же')
+        for table in tables:
+            self.export(table, checkpoint)
+
+    def export(self, table: Table, checkpoint: Checkpoint) -> None:
+        state = checkpoint.table(table.name)
+        if state.get('done'):
+            self.report(f'{table.name}: уже выгружено')
+            return
+        state.setdefault('offset', 0)
+        state.setdefault('rows', 0)
+        names = list(table.columns)
+        rows = (table.model.objects.filter(pk__gt=state.get('pk', 0))
+                .order_by('pk').values_list(*table.columns.values()))
+        path = self.path(table)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as output:
+            # Хвост после последней сохранённой пачки — обрывок.
+            output.seek(state['offset'])
+            output.truncate()
+            for batch in _batches(rows.iterator(chunk_size=self.batch_size),
+                                  self.batch_size):
+                output.write(self.compress(_encode(
+                    names, batch, self.fmt, header=not state['offset'])))
+                output.flush()
+                os.fsync(output.fileno())
+                state.update(pk=batch[-1][0], offset=output.tell(),
+                             rows=state['rows'] + len(batch))
+                checkpoint.save()
+        state['done'] = True
+        checkpoint.save()
+        self.report(f'{table.name}: {state["rows"]}')
+
+
+class Importer:
+    def __init__(self, directory: str, batch_size: int = 5000, report=None):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.report = report or (lambda message: None)
+
+    def find(self, table: Table):
+        """Файл таблицы и его формат или (None, None)."""
+        for fmt in FORMATS:
+            for suffix in CODECS.values():
+                path = os.path.join(self.directory,
+                                    f'{table.name}.{fmt}{suffix}')
+                if os.path.exists(path):
+                    return path, fmt
+        return None, None
+
+    def run(self, tables=TABLES, rebuild: bool = True) -> None:
+        checkpoint = Checkpoint(
+            os.path.join(self.directory, IMPORT_CHECKPOINT))
+        for table in tables:
+            self.load(table, checkpoint)
+        self.reset_sequences(tables)
+        if rebuild:
+            denormalized.rebuild(self.report)
+
+    def load(self, table: Table, checkpoint: Checkpoint) -> None:
+        state = checkpoint.table(table.name)
+        path, fmt = self.find(table)
+        if path is None or state.get('done'):
+            self.report(f'{table.name}: пропущено')
+            return
+        state.setdefault('rows', 0)
+        with _reader(path) as stream:
+            rows = islice(_decode(stream, fmt), state['rows'], None)
+            for batch in _batches(rows, self.batch_size):
+                with transaction.atomic(), explicit_dates():
+                    table.model.objects.bulk_create(
+                        table.build(batch), ignore_conflicts=True)
+                state['rows'] += len(batch)
+                checkpoint.save()
+        state['done'] = True
+        checkpoint.save()
+        self.report(f'{table.name}: {state["rows"]}')
+
+    @staticmethod
+    def reset_sequences(tables) -> None:
+        """Строки пришли с готовыми pk: счётчики pk догоняют их."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [table.model for table in tables])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
@@ -1,50 +1,80 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
+
+from core.db_router import pin_primary
 
 from .forms import CommentForm, PostForm
+from . import (conditional, counters, feed_cache, search, thumbnails,
+               timeline)
 from .models import Follow, Group, Post
+from .pagination import (CURSOR_PARAM, ApproximatePaginator, CursorPaginator,
+                         comment_page, page_window)
 
 User = get_user_model()
 
 NUMBER_OF_ENTRIES: int = 10
+COMMENTS_PER_PAGE: int = 20
+COMMENTS_CURSOR_PARAM: str = 'comments'
+
 
+def select_paginator(request, selection, count=None):
+    """Постраничный вывод ленты.
 
-def select_paginator(request, selection, ):
-    paginator = Paginator(selection, NUMBER_OF_ENTRIES)
+    Keyset-режим включается настройкой POSTS_KEYSET_PAGINATION
+    или параметром ?cursor= в запросе. count — число записей ленты
+    из счётчика, если он есть: тогда COUNT(*) не нужен.
+    """
+    if settings.POSTS_KEYSET_PAGINATION or CURSOR_PARAM in request.GET:
+        paginator = CursorPaginator(selection, NUMBER_OF_ENTRIES)
+        return paginator.get_page(request.GET.get(CURSOR_PARAM))
+    paginator = ApproximatePaginator(selection, NUMBER_OF_ENTRIES, count)
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    page_obj = paginator.get_page(page_number)
+    # Шаблон выводит окно номеров, а не все paginator.page_range.
+    page_obj.window = page_window(page_obj)
+    return page_obj
 
 
 def index(request: HttpRequest) -> HttpResponse:
     """Обработчик запроса страницы - index()"""
-    selection = Post.objects.select_related('author')
+    selection = Post.objects.for_feed()
     page_obj = select_paginator(request, selection)
     context = {
         'page_obj': page_obj,
+        'feed_cache': feed_cache.fragment(
+            feed_cache.index_scope(), feed_cache.groups_scope()),
     }
     return render(request, 'posts/index.html', context)
 
 
+@condition(etag_func=conditional.group_etag)
 def group_posts(request, slug: str):
     """Выводит шаблон с группами постов"""
     group = get_object_or_404(Group, slug=slug)
-    selection = group.posts.all()
-    page_obj = select_paginator(request, selection)
+    selection = group.posts.for_feed()
+    page_obj = select_paginator(request, selection, group.posts_count)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'feed_cache': feed_cache.fragment(feed_cache.group_scope(group.pk)),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@condition(etag_func=conditional.profile_etag)
 def profile(request, username: str):
     """Страница профайла пользователя."""
-    author = get_object_or_404(User, username=username)
-    selection = author.posts.all()
-    page_obj = select_paginator(request, selection)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    selection = author.posts.for_feed()
+    stats = counters.stats_for(author)
+    page_obj = select_paginator(request, selection, stats.posts_count)
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             user=request.user, author=author
@@ -55,10 +85,28 @@ def profile(request, username: str):
         'author': author,
         'following': following,
         'page_obj': page_obj,
+        'posts_count': stats.posts_count,
+        'stats': stats,
+        'feed_cache': feed_cache.fragment(
+            feed_cache.author_scope(author.pk), feed_cache.groups_scope()),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def post_search(request):
+    """Полнотекстовый поиск по постам."""
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = search.search_page(
+            query, request.GET.get(CURSOR_PARAM), NUMBER_OF_ENTRIES)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     """страница для публикации постов."""
@@ -67,24 +115,46 @@ def post_create(request):
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            post.save()
+            with transaction.atomic():
+                post.save()
+                thumbnails.enqueue(post)
             return redirect('posts:profile', username=post.author)
         return render(request, 'posts/create_post.html', {'form': form})
     form = PostForm(request.FILES or None)
     return render(request, 'posts/create_post.html', {'form': form})
 
 
+@condition(etag_func=conditional.post_etag)
 def post_detail(request, post_id: int):
     """Страница для просмотра отдельного поста."""
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id)
     author = post.author
     form = CommentForm()
+    comments, comments_next = comment_page(
+        post.comments.select_related('author'),
+        request.GET.get(COMMENTS_CURSOR_PARAM), COMMENTS_PER_PAGE)
     context = {'author': author,
                'post': post,
+               'comments': comments,
+               'comments_next': comments_next,
                'form': form}
     return render(request, 'posts/post_details.html', context)
 
 
+@condition(etag_func=conditional.post_etag)
+def post_comments(request, post_id: int):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments, comments_next = comment_page(
+        post.comments.select_related('author'),
+        request.GET.get(COMMENTS_CURSOR_PARAM), COMMENTS_PER_PAGE)
+    context = {'post': post,
+               'comments': comments,
+               'comments_next': comments_next}
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
 def add_comment(request, post_id):
     """Добавление комментария к посту"""
@@ -94,7 +164,8 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post_id = post_id
-        comment.save()
+        with transaction.atomic():
+            comment.save()
         return redirect('posts:post_detail', post_id=post_id)
     return render(request, 'core/404.html', {'path': request.path}, status=404)
 
@@ -110,7 +181,10 @@ def post_edit(request, post_id: int):
         files=request.FILES or None,
         instance=post)
     if form.is_valid():
-        form.save()
+        with transaction.atomic():
+            form.save()
+            if 'image' in form.changed_data:
+                thumbnails.enqueue(post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -124,32 +198,52 @@ def post_edit(request, post_id: int):
 def follow_index(request):
     """Новая запись пользователя появляется в ленте
     тех, кто на него подписан и не появляется в ленте тех
-    кто не подписан."""
-    selection = Post.objects.select_related(
-        'author', 'group').filter(
-        author__following__user=request.user)
-    page_obj = select_paginator(request, selection)
+    кто не подписан.
+
+    Страница читается из материализованной ленты пользователя;
+    посты авторов-знаменитостей, которые не раскладываются по лентам,
+    подмешиваются при чтении."""
+    entries = request.user.timeline.all()
+    celebrities = timeline.followed_celebrities(request.user)
+    if celebrities:
+        selection = Post.objects.for_feed().filter(
+            Q(pk__in=entries.values('post'))
+            | Q(author_id__in=celebrities))
+        page_obj = select_paginator(request, selection)
+        page_obj.object_list = list(page_obj.object_list)
+    else:
+        page_obj = select_paginator(request, timeline.for_feed(entries))
+        page_obj.object_list = [entry.post for entry in page_obj]
+    # Комментарии не сдвигают ленты подписчиков: страница уже прочитана,
+    # и версии её карточек входят в ключ фрагмента.
     context = {
         'page_obj': page_obj,
+        'feed_cache': feed_cache.fragment(
+            feed_cache.follow_scope(request.user.pk),
+            feed_cache.groups_scope(), posts=page_obj.object_list),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@pin_primary
 def profile_follow(request, username):
     """Авторизованный пользователь может
     подписываться на других пользователей"""
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        with transaction.atomic():
+            Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:follow_index')
 
 
 @login_required
+@pin_primary
 def profile_unfollow(request, username):
     """Авторизованный пользователь может отписываться от пользователей"""
     author = get_object_or_404(User, username=username)
     follower = Follow.objects.filter(user=request.user, author=author)
     if follower.exists():
-        follower.delete()
+        with transaction.atomic():
+            follower.delete()
     return redirect('posts:follow_index')
@@ -10,7 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
+
+from core.cache_backends import cache_from_url
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -43,16 +49,22 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'benchmarks.apps.BenchmarksConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.page_cache.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -85,9 +97,51 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение переживает запрос: PRAGMA ниже выполняются
+        # один раз на соединение.
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 60)),
     }
 }
 
+# Профиль SQLite для небольших серверов (см. core.sqlite): WAL, чтобы
+# запись не блокировала чтение, и ожидание блокировки вместо ошибки.
+# SQLITE_TUNING=0 оставляет настройки SQLite по умолчанию.
+SQLITE_PRAGMAS = {}
+if os.environ.get('SQLITE_TUNING', '1') == '1':
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        # Отрицательное значение — размер в КиБ, а не в страницах.
+        'cache_size': -64 * 1024,
+        'busy_timeout': 5000,
+    }
+
+# Реплики для чтения лент: алиасы из DATABASES. Локально реплику
+# задаёт DATABASE_REPLICA — путь ко второму файлу SQLite, который
+# обновляет команда sync_replica.
+REPLICA_DATABASES = []
+if os.environ.get('DATABASE_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['DATABASE_REPLICA'],
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append('replica')
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+# Представления, которым можно читать с реплики.
+REPLICA_READ_VIEWS = (
+    'posts:index', 'posts:group_list', 'posts:profile',
+    'posts:post_detail', 'posts:follow_index',
+)
+# round_robin — по кругу, least_lag — наименее отстающая реплика.
+REPLICA_SELECTION = os.environ.get('REPLICA_SELECTION', 'least_lag')
+REPLICA_MAX_LAG = 5
+REPLICA_LAG_CHECK_INTERVAL = 1
+# Сколько секунд после записи браузер читает основную базу.
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -121,15 +175,89 @@ USE_L10N = True
 
 USE_TZ = True
 
+# Кэш общий для всех воркеров: по умолчанию файл SQLite рядом с проектом,
+# в продакшене адрес задаётся переменной окружения CACHE_URL, например
+# memcached://127.0.0.1:11211 или redis://127.0.0.1:6379/0 (django-redis).
+# Карточки, страницы для гостей и версии лент — это десятки тысяч ключей:
+# предел Django по умолчанию (300) заставил бы кэш постоянно чиститься.
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 100000))
+# Тесты очищают кэш: у них свой, в памяти, а не файл разработчика.
+TESTING = 'test' in sys.argv[1:2] or 'pytest' in sys.modules
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    'default': cache_from_url(
+        'locmem://' if TESTING
+        else os.environ.get('CACHE_URL', 'sqlite://cache.sqlite3'),
+        BASE_DIR,
+        key_prefix=os.environ.get('CACHE_KEY_PREFIX', 'yatube'),
+        version=int(os.environ.get('CACHE_VERSION', 1)),
+        max_entries=CACHE_MAX_ENTRIES,
+    )
 }
 
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Лента постов: keyset-пагинация по ?cursor= вместо номеров страниц.
+POSTS_KEYSET_PAGINATION = False
+# Лента длиннее порога считается приблизительно (счётчик, статистика
+# таблицы или COUNT(*) из кэша на PAGINATOR_COUNT_TIMEOUT секунд),
+# короче — точным COUNT(*).
+PAGINATOR_EXACT_COUNT_BELOW = 10000
+PAGINATOR_COUNT_TIMEOUT = 60
+
+# Лента подписок: авторы с таким числом подписчиков и больше
+# не раскладываются по материализованным лентам при публикации.
+TIMELINE_CELEBRITY_FOLLOWERS = 1000
+TIMELINE_BATCH_SIZE = 1000
+
+# Фрагменты лент сбрасываются сигналами при записи,
+# поэтому их можно хранить долго.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Готовые страницы для гостей: сбрасываются сигналами при записи,
+# а прокси ниже по цепочке хранят их не дольше PAGE_CACHE_MAX_AGE секунд.
+PAGE_CACHE = os.environ.get('PAGE_CACHE', '1') == '1'
+PAGE_CACHE_VIEWS = ('posts:index', 'posts:group_list', 'posts:profile',
+                    'posts:post_detail')
+PAGE_CACHE_TIMEOUT = 60 * 60
+PAGE_CACHE_MAX_AGE = 30
+
+# Single-flight пересчёт кэша: сколько ещё отдавать устаревшую копию,
+# сколько держать блокировку пересчёта и сколько ждать чужого пересчёта.
+SINGLEFLIGHT_STALE_TIMEOUT = 60 * 5
+SINGLEFLIGHT_LOCK_TIMEOUT = 30
+SINGLEFLIGHT_WAIT = 2
+
+# Миниатюры картинок постов: основной размер ленты и адаптивные варианты.
+# Генерируются командой thumbnail_worker; без очереди — прямо при сохранении.
+POST_THUMBNAIL_SIZES = ('960x339', '480x170', '1920x678')
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+POST_THUMBNAILS_ASYNC = True
+POST_THUMBNAIL_MAX_ATTEMPTS = 3
+
+# Замеры запросов: Server-Timing, лог медленных запросов с SQL
+# и гистограммы на /debug/timings/. Выключенный middleware не работает.
+REQUEST_TIMING = os.environ.get('REQUEST_TIMING') == '1'
+REQUEST_TIMING_SLOW_MS = 500
+REQUEST_TIMING_LOGGED_QUERIES = 20
+
+# Метрики Prometheus на /metrics: каждый процесс пишет свои значения
+# в файл в METRICS_DIR, представление складывает файлы всех процессов.
+METRICS_ENABLED = os.environ.get('METRICS', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR',
+                             os.path.join(BASE_DIR, 'metrics'))
+METRICS_FLUSH_INTERVAL = 1
+
+# API лент: размер страницы по умолчанию и предел для ?limit=.
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+
+# Ленты Atom/RSS/JSON Feed: число записей, строк на одно чтение из базы
+# и предел размера готовой ленты, которую ещё стоит класть в кэш.
+SYNDICATION_ITEMS = 50
+SYNDICATION_CHUNK_SIZE = 100
+SYNDICATION_CACHE_MAX_BYTES = 1024 * 1024
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
@@ -138,5 +266,9 @@ LOGIN_REDIRECT_URL = 'posts:index'
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+if TESTING:
+    # Картинки из тестов пишутся во временный каталог, а не в media/.
+    MEDIA_ROOT = tempfile.mkdtemp(prefix='yatube-media-')
+    atexit.register(shutil.rmtree, MEDIA_ROOT, ignore_errors=True)
 
 STATIC_URL = '/static/'
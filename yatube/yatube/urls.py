@@ -2,6 +2,8 @@ from django.conf.urls import handler403, handler404, handler500
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import metrics_view, request_timings
+
 urlpatterns = [
     # импорт правил из приложения posts
     path('', include('posts.urls', namespace='posts')),
@@ -9,6 +11,9 @@ urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/v1/', include('api.urls', namespace='api')),
+    path('debug/timings/', request_timings, name='request_timings'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 handler403 = 'core.views.csrf_failure'